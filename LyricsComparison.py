@@ -2,6 +2,8 @@ import re
 from collections import Counter
 import string
 from difflib import SequenceMatcher
+from metrics import COMPARE_LYRICS_SECONDS
+from tracing import span
 
 class LyricsComparator:
     def __init__(self):
@@ -134,7 +136,16 @@ class LyricsComparator:
 
         return (intersection / union) * 100
 
+    @COMPARE_LYRICS_SECONDS.timed
     def compare_lyrics(self, transcribed_lyrics, reference_lyrics):
+        with span("lyrics.compare") as compare_span:
+            results = self._compare_lyrics(transcribed_lyrics, reference_lyrics)
+            compare_span.set(reference_words=results.get('word_count_ref'),
+                             transcribed_words=results.get('word_count_hyp'),
+                             overall_score=round(results['overall_score'], 1))
+            return results
+
+    def _compare_lyrics(self, transcribed_lyrics, reference_lyrics):
         if not transcribed_lyrics and not reference_lyrics:
             return {
                 'wer': 0.0,
@@ -166,10 +177,14 @@ class LyricsComparator:
             }
 
         # Calculate all metrics
-        wer = self.calculate_wer(reference_lyrics, transcribed_lyrics)
-        bow_f1 = self.calculate_bow_f1(reference_lyrics, transcribed_lyrics)
-        bigram_f1 = self.calculate_bigram_f1(reference_lyrics, transcribed_lyrics)
-        semantic_similarity = self.calculate_semantic_similarity(reference_lyrics, transcribed_lyrics)
+        with span("wer"):
+            wer = self.calculate_wer(reference_lyrics, transcribed_lyrics)
+        with span("bow_f1"):
+            bow_f1 = self.calculate_bow_f1(reference_lyrics, transcribed_lyrics)
+        with span("bigram_f1"):
+            bigram_f1 = self.calculate_bigram_f1(reference_lyrics, transcribed_lyrics)
+        with span("semantic_similarity"):
+            semantic_similarity = self.calculate_semantic_similarity(reference_lyrics, transcribed_lyrics)
 
         # Calculate overall score (weighted average)
         wer_score = max(0, 100 - wer)  # Convert WER to accuracy score
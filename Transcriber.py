@@ -5,6 +5,13 @@ import wave
 import os
 import threading
 import time
+from audio_engine import DuplexAudioEngine, resample
+from metrics import (RECORD_DURATION_SECONDS, AUDIO_WRITE_SECONDS, MODEL_LOAD_SECONDS,
+                     WHISPER_DECODE_SECONDS, TRANSCRIPTIONS)
+from tracing import span
+
+# Returned by transcribe_pcm(partial=True) when the model was left to a final transcription
+MODEL_BUSY = object()
 
 class AudioTranscriber:
     def __init__(self, model_size="base", sample_rate=16000):
@@ -14,100 +21,143 @@ class AudioTranscriber:
         self.model = None
         self.is_recording = False
         self.audio_data = None
-        self.recording_thread = None
+        self.recording_started = None
         self.recording_duration = 10  # Default duration in seconds
+        # Mic capture (and any backing track) share one duplex stream, so a
+        # take stays on the track's clock; its capture ring is sized up front
+        self.engine = DuplexAudioEngine()
+        self._capture_from = 0
+        self.model_lock = threading.Lock()
+        self._finals_waiting = 0  # full transcriptions queued for model_lock; partials give way to them
+        self._waiting_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # The model is loaded on first transcription (or by load_model()), so
+        # constructing a transcriber needs neither the weights nor the network
+
+    def load_model(self):
+        """Load the Whisper model if it is not loaded yet and return it"""
+        with self._load_lock:
+            if self.model is None:
+                print("Loading Whisper model...")
+                with MODEL_LOAD_SECONDS.time(), span("transcriber.load_model", model_size=self.model_size):
+                    self.model = whisper.load_model(self.model_size)
+                print(f"Whisper {self.model_size} model loaded successfully!")
+        return self.model
+
+    def _open_stream(self, seconds):
+        """Start the engine's stream unless it is running, with room for seconds of capture"""
+        if not self.engine.is_active:
+            self.engine.start(capture_seconds=max(seconds, self.recording_duration))
+
+    def _close_stream_if_idle(self):
+        if not self.is_recording and self.engine.playback_finished:
+            self.engine.close()
+
+    def _to_pcm(self, captured):
+        """Engine capture (float32, engine rate) as mono int16 at the transcriber's rate"""
+        if len(captured) == 0:
+            return None
+        mono = resample(captured.mean(axis=1), self.engine.samplerate, self.sample_rate)
+        return (np.clip(mono, -1.0, 1.0) * 32767).astype(np.int16)
+
+    def play_backing(self, wav_path):
+        """Play a WAV backing track on the recording stream; returns False if it cannot"""
+        try:
+            self.engine.load_backing_file(wav_path)
+            self._open_stream(self.engine.backing_seconds)
+            return True
+        except Exception as e:
+            print(f"Error playing backing track: {e}")
+            return False
 
-        print("Loading Whisper model...")
-        self.model = whisper.load_model(model_size)
-        print(f"Whisper {model_size} model loaded successfully!")
+    def stop_backing(self):
+        self.engine.stop_backing()
+        self._close_stream_if_idle()
 
     def start_recording(self):
         if self.is_recording:
             print("Already recording!")
             return
 
-        self.is_recording = True
         self.audio_data = None
-
-        def record_audio():
-            print("🎤 Recording started... Press ENTER again to stop.")
-            try:
-                # Record audio using the working approach from your reference code
-                self.audio_data = sd.rec(
-                    int(self.recording_duration * self.sample_rate),
-                    samplerate=self.sample_rate,
-                    channels=1,
-                    dtype='int16'
-                )
-
-                # Wait until recording is complete or stopped
-                while self.is_recording and not sd.wait():
-                    time.sleep(0.1)
-
-            except Exception as e:
-                print(f"Recording error: {e}")
-                self.audio_data = None
-
-        self.recording_thread = threading.Thread(target=record_audio)
-        self.recording_thread.daemon = True
-        self.recording_thread.start()
+        self.recording_started = time.perf_counter()
+        try:
+            self._open_stream(self.recording_duration)
+        except Exception as e:
+            print(f"Recording error: {e}")
+            return
+        self._capture_from = self.engine.frames_processed
+        self.is_recording = True
+        print("🎤 Recording started... Press ENTER again to stop.")
 
     def stop_recording(self):
         if not self.is_recording:
             print("Not currently recording!")
             return None
 
-        print("🛑 Stopping recording...")
-        self.is_recording = False
-
-        # Stop the recording immediately
-        sd.stop()
-
-        # Wait for recording thread to finish
-        if self.recording_thread:
-            self.recording_thread.join(timeout=2.0)
-
-        if self.audio_data is None:
-            print("No audio data recorded!")
-            return None
+        with span("transcriber.stop_recording", model_size=self.model_size) as stop_span:
+            print("🛑 Stopping recording...")
+            self.is_recording = False
+            recorded_seconds = time.perf_counter() - self.recording_started
+            RECORD_DURATION_SECONDS.observe(recorded_seconds)
+            stop_span.set(recorded_seconds=round(recorded_seconds, 2))
+
+            # Take the capture; the stream stays up while a backing track plays
+            with span("stop_stream"):
+                captured = self.engine.capture(self._capture_from)
+                self._close_stream_if_idle()
+            self.audio_data = self._to_pcm(captured)
+
+            if self.audio_data is None:
+                print("No audio data recorded!")
+                return None
 
-        # Save audio to temporary WAV file using the working approach
-        try:
-            with wave.open(self.temp_filename, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)  # 16-bit audio
-                wf.setframerate(self.sample_rate)
-                wf.writeframes(self.audio_data.tobytes())
+            # Save audio to temporary WAV file using the working approach
+            try:
+                audio_seconds = len(self.audio_data) / self.sample_rate
+                with AUDIO_WRITE_SECONDS.time(), span("write_wav", audio_seconds=audio_seconds), \
+                        wave.open(self.temp_filename, 'wb') as wf:
+                    wf.setnchannels(1)
+                    wf.setsampwidth(2)  # 16-bit audio
+                    wf.setframerate(self.sample_rate)
+                    wf.writeframes(self.audio_data.tobytes())
 
-            print("🔄 Transcribing audio...")
-            transcribed_text = self.transcribe_audio()
+                print("🔄 Transcribing audio...")
+                transcribed_text = self.transcribe_audio()
 
-            # Clean up temporary file
-            if os.path.exists(self.temp_filename):
-                os.remove(self.temp_filename)
+                # Clean up temporary file
+                with span("cleanup"):
+                    if os.path.exists(self.temp_filename):
+                        os.remove(self.temp_filename)
 
-            return transcribed_text
+                stop_span.set(words=len(transcribed_text.split()) if transcribed_text else 0)
+                return transcribed_text
 
-        except Exception as e:
-            print(f"Error saving/transcribing audio: {e}")
-            return None
+            except Exception as e:
+                print(f"Error saving/transcribing audio: {e}")
+                return None
 
     def record_fixed_duration(self, duration_seconds=10):
         print(f"Recording for {duration_seconds} seconds... sing now!")
 
-        # Use the exact working approach from your reference code
-        audio_data = sd.rec(
-            int(duration_seconds * self.sample_rate),
-            samplerate=self.sample_rate,
-            channels=1,
-            dtype='int16'
-        )
-        sd.wait()
+        RECORD_DURATION_SECONDS.observe(duration_seconds)
+        try:
+            self._open_stream(duration_seconds)
+        except Exception as e:
+            print(f"Recording error: {e}")
+            return None
+        since = self.engine.frames_processed
+        sd.sleep(int(duration_seconds * 1000))
+        audio_data = self._to_pcm(self.engine.capture(since))
+        self._close_stream_if_idle()
         print("Recording complete!")
+        if audio_data is None:
+            print("No audio data recorded!")
+            return None
 
         # Save to WAV file
         try:
-            with wave.open(self.temp_filename, 'wb') as wf:
+            with AUDIO_WRITE_SECONDS.time(), wave.open(self.temp_filename, 'wb') as wf:
                 wf.setnchannels(1)
                 wf.setsampwidth(2)  # 16-bit audio
                 wf.setframerate(self.sample_rate)
@@ -126,6 +176,32 @@ class AudioTranscriber:
             print(f"Error saving/transcribing audio: {e}")
             return None
 
+    def _run_model(self, audio, source, partial=False):
+        """
+        Every Whisper call goes through here: one model serves all sessions and
+        inference is not thread-safe. Partial (live preview) decodes never queue
+        for the model; they return MODEL_BUSY if it is in use or a full
+        transcription is waiting for it.
+        """
+        if partial:
+            if self._finals_waiting or not self.model_lock.acquire(blocking=False):
+                return MODEL_BUSY
+        else:
+            with self._waiting_lock:
+                self._finals_waiting += 1
+            try:
+                with span("wait_for_model"):
+                    self.model_lock.acquire()
+            finally:
+                with self._waiting_lock:
+                    self._finals_waiting -= 1
+        try:
+            model = self.load_model()
+            with WHISPER_DECODE_SECONDS.labels(source).time():
+                return model.transcribe(audio, language='en')
+        finally:
+            self.model_lock.release()
+
     def transcribe_audio(self):
         if not os.path.exists(self.temp_filename):
             print("No audio file found to transcribe!")
@@ -133,18 +209,22 @@ class AudioTranscriber:
 
         try:
             # Transcribe using Whisper
-            result = self.model.transcribe(self.temp_filename, language='en')
+            with span("whisper.decode", model_size=self.model_size, source='recording'):
+                result = self._run_model(self.temp_filename, 'recording')
             transcribed_text = result["text"].strip()
 
             if not transcribed_text:
                 print("No speech detected in the audio.")
+                TRANSCRIPTIONS.labels('empty').inc()
                 return None
 
             print(f"✅ Transcription complete!")
+            TRANSCRIPTIONS.labels('ok').inc()
             return transcribed_text
 
         except Exception as e:
             print(f"Transcription error: {e}")
+            TRANSCRIPTIONS.labels('error').inc()
             return None
 
     def transcribe_file(self, audio_file_path):
@@ -154,13 +234,52 @@ class AudioTranscriber:
 
         try:
             print(f"Transcribing file: {audio_file_path}")
-            result = self.model.transcribe(audio_file_path, language='en')
+            with span("whisper.decode", model_size=self.model_size, source='file'):
+                result = self._run_model(audio_file_path, 'file')
             return result["text"].strip()
 
         except Exception as e:
             print(f"Error transcribing file: {e}")
             return None
 
+    def transcribe_pcm(self, pcm, sample_rate=16000, partial=False):
+        """
+        Transcribe 16 kHz mono int16 samples already in memory (e.g. from a
+        browser capture). With partial=True the call is a live preview that
+        returns MODEL_BUSY instead of waiting for the model.
+        """
+        if pcm is None or len(pcm) == 0:
+            print("No audio data to transcribe!")
+            return None
+        if sample_rate != 16000:
+            print(f"Expected 16 kHz audio, got {sample_rate} Hz")
+            return None
+
+        try:
+            audio = pcm.astype(np.float32) / 32768.0
+            with span("whisper.decode", model_size=self.model_size, source='pcm',
+                      audio_seconds=round(len(pcm) / sample_rate, 2)) as decode_span:
+                result = self._run_model(audio, 'partial' if partial else 'pcm', partial)
+                if result is MODEL_BUSY:
+                    decode_span.set(skipped=True)
+                    return MODEL_BUSY
+                decode_span.set(words=len(result["text"].split()))
+            transcribed_text = result["text"].strip()
+
+            if not transcribed_text:
+                print("No speech detected in the audio.")
+                TRANSCRIPTIONS.labels('empty').inc()
+                return None
+
+            print("✅ Transcription complete!")
+            TRANSCRIPTIONS.labels('ok').inc()
+            return transcribed_text
+
+        except Exception as e:
+            print(f"Transcription error: {e}")
+            TRANSCRIPTIONS.labels('error').inc()
+            return None
+
     def get_available_audio_devices(self):
         devices = sd.query_devices()
         print("Available audio devices:")
@@ -178,6 +297,7 @@ class AudioTranscriber:
 
     def cleanup(self):
         self.is_recording = False
+        self.engine.close()
         if os.path.exists(self.temp_filename):
             os.remove(self.temp_filename)
 
@@ -1,42 +1,120 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from flask_cors import CORS
+import gzip
+import hashlib
 import json
 import threading
 import time
+from collections import OrderedDict
 from Transcriber import AudioTranscriber
 from LyricsComparison import LyricsComparator
-from spotify_stuff import SpotifyController
+from playback_backends import create_backend
+from song_catalog import load_songs, SongCatalog
+from local_audio_index import LocalAudioIndex
+import metrics
+import memory_budget
+from profiling import install_profiler
 import os
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
+# Sampling profiler for opted-in requests; off unless $KARAOKE_PROFILE_ENABLED=1
+install_profiler(app)
+
+# /api/songs paging and caching limits
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_CACHED_SONG_RESPONSES = 256
+GZIP_MIN_BYTES = 1024
 
 class KaraokeWebApp:
     def __init__(self):
         self.songs_database = self.load_songs_database()
+        self.catalog = SongCatalog(self.songs_database)
         self.transcriber = AudioTranscriber()
         self.comparator = LyricsComparator()
-        self.spotify = SpotifyController()
+        # Spotify, local-only or fake playback, chosen by $KARAOKE_PLAYBACK_BACKEND
+        self.playback = create_backend()
         self.current_song = None
         self.is_recording = False
         self.is_playing = False
         self.local_audio_folder = "local_audio"
 
+        # Serialized /api/songs responses keyed by (catalog version, query);
+        # edits made through self.catalog bump the version and invalidate them
+        self._songs_responses = OrderedDict()  # least recently used first
+        self._songs_responses_lock = threading.Lock()
+
         # Create local audio folder
         if not os.path.exists(self.local_audio_folder):
             os.makedirs(self.local_audio_folder)
+        self.audio_index = LocalAudioIndex(self.local_audio_folder)
+        # Decode local backing tracks in the background so they start instantly
+        self.playback.warm(self.audio_index.paths())
 
     def load_songs_database(self):
-        with open('blind-karaoke/src/lib/database/songs.json', 'r') as f:
-            data = json.load(f)
-            return data['songs']
+        return load_songs()
 
     def select_song_by_id(self, song_id):
-        for song in self.songs_database:
-            if song['id'] == song_id:
-                self.current_song = song
-                return self.current_song
-        return None
+        song = self.catalog.get(song_id)
+        if song:
+            self.current_song = song
+        return song
+
+    def query_songs(self, genre=None, mood=None, fields=None, page=1, per_page=None):
+        """Filter, paginate (per_page=None returns every match) and project the song list"""
+        songs = self.songs_database
+        if genre:
+            genre = genre.lower()
+            songs = [song for song in songs if song.get('genre', '').lower() == genre]
+        if mood:
+            mood = mood.lower()
+            songs = [song for song in songs if mood in (m.lower() for m in song.get('moods', []))]
+
+        total = len(songs)
+        if per_page is None:
+            page_songs = songs
+        else:
+            start = (page - 1) * per_page
+            page_songs = songs[start:start + per_page]
+
+        if fields:
+            page_songs = [{field: song.get(field) for field in fields} for song in page_songs]
+        else:
+            page_songs = [dict(song) for song in page_songs]
+        return page_songs, total
+
+    def get_songs_response(self, genre=None, mood=None, fields=None, page=1, per_page=None):
+        """Return a cached serialized /api/songs payload: (body, gzipped body, etag, total)"""
+        key = (self.catalog.version, genre, mood, fields, page, per_page)
+        with self._songs_responses_lock:
+            cached = self._songs_responses.get(key)
+            if cached:
+                self._songs_responses.move_to_end(key)
+        if cached:
+            return cached
+
+        songs, total = self.query_songs(genre, mood, fields, page, per_page)
+        body = json.dumps(songs, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        gzipped = gzip.compress(body) if len(body) >= GZIP_MIN_BYTES else None
+        etag = hashlib.sha1(body).hexdigest()
+        cached = (body, gzipped, etag, total)
+
+        with self._songs_responses_lock:
+            self._songs_responses[key] = cached
+            self._songs_responses.move_to_end(key)
+            while len(self._songs_responses) > MAX_CACHED_SONG_RESPONSES:
+                self._songs_responses.popitem(last=False)
+        return cached
+
+    def songs_responses_bytes(self):
+        with self._songs_responses_lock:
+            cached = list(self._songs_responses.values())
+        return sum(len(body) + len(gzipped or b"") for body, gzipped, _, _ in cached)
+
+    def drop_songs_responses(self):
+        with self._songs_responses_lock:
+            self._songs_responses.clear()
 
     def start_recording(self):
         if not self.is_recording:
@@ -62,25 +140,7 @@ class KaraokeWebApp:
 
     def find_local_audio_file(self, song_title, artist):
         """Find local audio file for the song"""
-        if not os.path.exists(self.local_audio_folder):
-            return None
-
-        extensions = ['.mp3', '.wav', '.ogg', '.m4a']
-        patterns = [
-            f"{song_title}",
-            f"{artist} - {song_title}",
-            f"{song_title} - {artist}",
-            f"{song_title.lower()}",
-            f"{artist.lower()} - {song_title.lower()}"
-        ]
-
-        for pattern in patterns:
-            for ext in extensions:
-                filename = pattern + ext
-                filepath = os.path.join(self.local_audio_folder, filename)
-                if os.path.exists(filepath):
-                    return filepath
-        return None
+        return self.audio_index.find(song_title, artist)
 
     def start_music(self):
         if self.current_song and not self.is_playing:
@@ -91,11 +151,11 @@ class KaraokeWebApp:
             )
 
             if local_file:
-                if self.spotify.play_local_file(local_file):
+                if self.playback.play_local_file(local_file):
                     self.is_playing = True
                     return {'status': 'success', 'source': 'local', 'file': os.path.basename(local_file)}
             elif self.current_song['spotify_track_id']:
-                if self.spotify.play_track(
+                if self.playback.play_track(
                     self.current_song['spotify_track_id'],
                     song_title=self.current_song['title'],
                     artist=self.current_song['artist']
@@ -108,7 +168,7 @@ class KaraokeWebApp:
 
     def stop_music(self):
         if self.is_playing:
-            self.spotify.pause_playback()
+            self.playback.pause_playback()
             self.is_playing = False
             return {'status': 'success'}
         return {'status': 'error', 'message': 'Not currently playing'}
@@ -116,6 +176,16 @@ class KaraokeWebApp:
 # Create global app instance
 karaoke_app = KaraokeWebApp()
 
+# Gauge read only when /metrics is scraped
+metrics.ACTIVE_SESSIONS.labels('recording').set_function(lambda: int(karaoke_app.is_recording))
+
+# Memory accounting; caches are shed first when $KARAOKE_MEMORY_BUDGET_MB is exceeded
+memory_budget.register('whisper_model', lambda: memory_budget.model_bytes(karaoke_app.transcriber.model))
+memory_budget.register('recording_buffer', lambda: memory_budget.buffer_bytes(karaoke_app.transcriber.audio_data))
+memory_budget.register('songs_responses', karaoke_app.songs_responses_bytes,
+                       shed=karaoke_app.drop_songs_responses, priority=10)
+memory_budget.start_watchdog()
+
 # Routes
 @app.route('/')
 def index():
@@ -123,14 +193,70 @@ def index():
 
 @app.route('/api/songs', methods=['GET'])
 def get_songs():
-    return jsonify(karaoke_app.songs_database)
+    """
+    Song list with ?page=, ?per_page=, ?fields=a,b, ?genre= and ?mood= support.
+    Without page/per_page the full list is returned, as existing callers expect.
+    """
+    paginated = 'page' in request.args or 'per_page' in request.args
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(MAX_PAGE_SIZE, max(1, int(request.args.get('per_page', DEFAULT_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'page and per_page must be integers'}), 400
+
+    fields = request.args.get('fields')
+    if fields:
+        # Always include the id so clients can select a song from a projection
+        fields = tuple(dict.fromkeys(['id'] + [f.strip() for f in fields.split(',') if f.strip()]))
+
+    body, gzipped, etag, total = karaoke_app.get_songs_response(
+        genre=request.args.get('genre') or None,
+        mood=request.args.get('mood') or None,
+        fields=fields or None,
+        page=page if paginated else 1,
+        per_page=per_page if paginated else None
+    )
+
+    # The gzip and identity bodies are different representations, so they get different ETags
+    use_gzip = bool(gzipped) and request.accept_encodings['gzip'] > 0
+    if use_gzip:
+        etag = f"{etag}-gzip"
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+        'X-Total-Count': str(total)
+    }
+    if paginated:
+        headers['X-Page'] = str(page)
+        headers['X-Per-Page'] = str(per_page)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        body = gzipped
+    return Response(body, mimetype='application/json', headers=headers)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/memory', methods=['GET'])
+def get_memory():
+    """Per-component memory, current and peak RSS, budgets and (with tracemalloc on) top allocation sites"""
+    return jsonify(memory_budget.report(request.args.get('top', memory_budget.TOP_ALLOCATIONS, type=int)))
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify(karaoke_app.catalog.stats.summary())
 
 @app.route('/api/select-song', methods=['POST'])
 def select_song():
     song_id = request.json.get('song_id')
     song = karaoke_app.select_song_by_id(song_id)
     if song:
-        return jsonify({'status': 'success', 'song': song})
+        return jsonify({'status': 'success', 'song': dict(song)})
     return jsonify({'status': 'error', 'message': 'Song not found'})
 
 @app.route('/api/start-recording', methods=['POST'])
@@ -159,7 +285,7 @@ def get_status():
     return jsonify({
         'is_recording': karaoke_app.is_recording,
         'is_playing': karaoke_app.is_playing,
-        'current_song': karaoke_app.current_song
+        'current_song': dict(karaoke_app.current_song) if karaoke_app.current_song else None
     })
 
 if __name__ == '__main__':
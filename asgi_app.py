@@ -0,0 +1,329 @@
+"""
+ASGI serving mode for the karaoke web app.
+
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5000
+
+The karaoke /api/* endpoints run as coroutines on a single event loop. Their
+blocking work (transcription, Spotify and mixer calls) is awaited on bounded
+thread pools, so a session that is waiting costs a suspended coroutine rather
+than a worker thread, and slow transcriptions never hold up page loads.
+Everything else (pages, static files) is served by the Flask app in web_app.py
+through asgiref's WSGI adapter; both share the same game state and session.
+"""
+
+import asyncio
+import contextvars
+import json
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+
+from browser_capture import CaptureError
+from event_bus import KEEPALIVE_INTERVAL, format_sse
+from tracing import span
+from web_app import app, game
+
+IO_WORKERS = 16         # playback control and audio preparation
+TRANSCRIBE_WORKERS = 2  # whisper is CPU bound; more threads only contend
+MAX_BODY_BYTES = 2 * 1024 * 1024  # uploaded audio chunks are the largest bodies
+
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="asgi-io")
+transcribe_pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="asgi-transcribe")
+
+flask_app = WsgiToAsgi(app)
+
+
+async def run_blocking(pool, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Run in a copy of this context so spans opened in the worker nest under the handler's
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(pool, partial(context.run, func, *args, **kwargs))
+
+
+# -- session ------------------------------------------------------------------
+# The same server-side session store Flask uses, so a session started on a page
+# keeps working in the async API and vice versa.
+
+def load_session(headers):
+    cookie = SimpleCookie()
+    for name, value in headers:
+        if name == b'cookie':
+            cookie.load(value.decode('latin-1'))
+    morsel = cookie.get(app.config['SESSION_COOKIE_NAME'])
+    return app.session_interface.session_from_cookie(app, morsel.value if morsel else None)
+
+
+def save_session(session):
+    """Persist the session; returns the Set-Cookie headers to send"""
+    cookie_value = app.session_interface.persist(app, session)
+    if cookie_value is None:
+        return ()
+    cookie = SimpleCookie()
+    name = app.config['SESSION_COOKIE_NAME']
+    cookie[name] = cookie_value
+    cookie[name]['path'] = app.config['SESSION_COOKIE_PATH'] or '/'
+    cookie[name]['httponly'] = True
+    cookie[name]['samesite'] = app.config['SESSION_COOKIE_SAMESITE'] or 'Lax'
+    if not cookie_value:
+        cookie[name]['max-age'] = 0
+    return ((b'set-cookie', cookie[name].OutputString().encode('latin-1')),)
+
+
+# -- API handlers -------------------------------------------------------------
+
+async def get_stats(session, request):
+    return game.catalog.stats.summary()
+
+
+async def start_music(session, request):
+    song = session.get('current_song')
+    if not song:
+        return {'status': 'error', 'message': 'No song selected'}
+    return await run_blocking(io_pool, game.start_music, song, session.sid)
+
+
+async def stop_music(session, request):
+    return await run_blocking(io_pool, game.stop_music)
+
+
+async def start_recording(session, request):
+    return await run_blocking(io_pool, game.start_recording)
+
+
+async def finish_performance(session, stop_music_first):
+    """Stop recording, transcribe and score; shared by stop-recording and stop-karaoke"""
+    if stop_music_first:
+        transcribed_text, _ = await asyncio.gather(
+            run_blocking(transcribe_pool, game.stop_capture, session.sid, session.get('capture', 'server')),
+            run_blocking(io_pool, game.stop_music)
+        )
+    else:
+        transcribed_text = await run_blocking(transcribe_pool, game.stop_recording)
+    song = session.get('current_song')
+
+    if transcribed_text and song:
+        if not stop_music_first:
+            # Stop music when recording stops
+            await run_blocking(io_pool, game.stop_music)
+
+        results = await run_blocking(transcribe_pool, game.analyze_performance, transcribed_text, song['lyrics'])
+        session['results_data'] = {
+            'transcribed_text': transcribed_text,
+            'results': results
+        }
+        return {
+            'status': 'success',
+            'transcribed_text': transcribed_text,
+            'redirect': '/results'
+        }
+
+    return {'status': 'error', 'message': 'No transcription available'}
+
+
+async def stop_recording(session, request):
+    return await finish_performance(session, stop_music_first=False)
+
+
+async def start_karaoke(session, request):
+    """Combined endpoint: Start music and recording together"""
+    song = session.get('current_song')
+    if not song:
+        return {'status': 'error', 'message': 'No song selected'}
+
+    music_result = await run_blocking(io_pool, game.start_music, song, session.sid)
+    if music_result['status'] != 'success':
+        return music_result
+
+    capture = (json_body(request) or {}).get('capture', 'server')
+    session['capture'] = capture
+    recording_result = await run_blocking(io_pool, game.start_capture, session.sid, capture, song['lyrics'])
+    if recording_result['status'] != 'success':
+        await run_blocking(io_pool, game.stop_music)  # Stop music if recording fails
+        return recording_result
+
+    return {
+        'status': 'success',
+        'music_source': music_result.get('source', 'unknown'),
+        'message': 'Karaoke started! Music playing and recording...'
+    }
+
+
+async def stop_karaoke(session, request):
+    """Combined endpoint: Stop music and recording together"""
+    if (json_body(request) or {}).get('background'):
+        # Reply at once; the result arrives on /api/events as 'done' or 'failed'
+        await run_blocking(io_pool, game.stop_music)
+        game.job_pool.submit(game.run_performance_job, session.sid,
+                             session.get('capture', 'server'), session.get('current_song'))
+        return {'status': 'processing'}
+    with span("stop_karaoke", root=True):
+        return await finish_performance(session, stop_music_first=True)
+
+
+async def upload_chunk(session, request):
+    """Next MediaRecorder chunk of the singer's browser recording (?seq=0, 1, 2, ...)"""
+    try:
+        seq = int(request['query'].get('seq', [''])[0])
+    except ValueError:
+        seq = None
+    try:
+        # Writing to the decoder pipe can block briefly, so keep it off the loop
+        await run_blocking(io_pool, game.captures.feed, session.sid, seq, request['body'])
+    except CaptureError as e:
+        return {'status': 'error', 'message': str(e)}
+    return {'status': 'success'}
+
+
+API_ROUTES = {
+    ('GET', '/api/stats'): get_stats,
+    ('POST', '/api/start-music'): start_music,
+    ('POST', '/api/stop-music'): stop_music,
+    ('POST', '/api/start-recording'): start_recording,
+    ('POST', '/api/stop-recording'): stop_recording,
+    ('POST', '/api/start-karaoke'): start_karaoke,
+    ('POST', '/api/upload-chunk'): upload_chunk,
+    ('POST', '/api/stop-karaoke'): stop_karaoke,
+}
+
+
+# -- ASGI entry point -----------------------------------------------------------
+
+class BodyTooLarge(Exception):
+    pass
+
+
+async def read_body(receive, limit=MAX_BODY_BYTES):
+    """The whole request body; raises BodyTooLarge as soon as it passes limit"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        body.extend(message.get('body', b''))
+        if len(body) > limit:
+            raise BodyTooLarge()
+        if not message.get('more_body'):
+            break
+    return bytes(body)
+
+
+def json_body(request):
+    try:
+        return json.loads(request['body']) if request['body'] else None
+    except ValueError:
+        return None
+
+
+async def send_json(send, payload, extra_headers=(), status=200):
+    body = json.dumps(payload).encode('utf-8')
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii')),
+        (b'access-control-allow-origin', b'*'),
+        *extra_headers
+    ]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            io_pool.shutdown(wait=False)
+            transcribe_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def stream_events(scope, receive, send):
+    """/api/events as a coroutine: an open stream costs a queue, not a thread"""
+    session = load_session(scope['headers'])
+    if 'current_song' not in session:
+        await send_json(send, {'status': 'error', 'message': 'No song selected'})
+        return
+
+    last_event_id = None
+    for name, value in scope['headers']:
+        if name == b'last-event-id' and value.isdigit():
+            last_event_id = int(value)
+
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue()
+    unsubscribe = game.events.subscribe(
+        session.sid,
+        lambda item: loop.call_soon_threadsafe(pending.put_nowait, item),
+        last_event_id
+    )
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+        next_item = asyncio.ensure_future(pending.get())
+        while True:
+            done, _ = await asyncio.wait({next_item, disconnected}, timeout=KEEPALIVE_INTERVAL,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                break
+            if next_item in done:
+                chunk = format_sse(*next_item.result())
+                next_item = asyncio.ensure_future(pending.get())
+            else:
+                chunk = ": keepalive\n\n"
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+        next_item.cancel()
+    finally:
+        unsubscribe()
+        disconnected.cancel()
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/api/events':
+        await stream_events(scope, receive, send)
+        return
+
+    handler = None
+    if scope['type'] == 'http':
+        handler = API_ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await flask_app(scope, receive, send)
+        return
+
+    try:
+        body = await read_body(receive)
+    except BodyTooLarge:
+        # Never hand a truncated body (e.g. half an audio chunk) to a handler
+        await send_json(send, {'status': 'error', 'message': 'Request body too large'}, status=413)
+        return
+    request = {
+        'body': body,
+        'query': parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    }
+    session = load_session(scope['headers'])
+    payload = await handler(session, request)
+    await send_json(send, payload, save_session(session))
+
+
+if __name__ == '__main__':
+    import uvicorn
+    print("Blind Karaoke Web App (async) Starting...")
+    print("Open your browser to: http://localhost:5000")
+    uvicorn.run(application, host='0.0.0.0', port=5000)
@@ -0,0 +1,268 @@
+"""
+Low-latency duplex audio engine: backing-track playback and microphone capture
+on one sounddevice stream, so both run on the same clock.
+
+The mic is captured into a ring buffer preallocated when the stream starts
+(sized from the expected take length; the newest audio wins if a take runs
+longer), so the callback only copies samples and never allocates. Blocks are
+timestamped with PortAudio's ADC/DAC times, keeping the first block and a
+bounded window of recent ones. From those, alignment_offset() tells how many
+captured samples precede the moment the first backing sample reached the
+speakers, and aligned_capture() returns the vocal take on the backing track's
+timeline (sample i of the take lines up with sample i of the track).
+measure_round_trip() plays a click and finds it in the input to measure the
+real speaker-to-mic latency.
+"""
+
+import threading
+import wave
+from collections import deque
+from math import gcd
+
+import numpy as np
+import sounddevice as sd
+from scipy.signal import resample_poly
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_BLOCKSIZE = 256  # ~5.8 ms per block at 44.1 kHz
+DEFAULT_CAPTURE_SECONDS = 10
+BLOCK_TIMES_KEPT = 1024  # ~6 s of block timestamps at the default blocksize
+
+
+def load_wav(filename, samplerate=None):
+    """Load a 16-bit WAV as float32 (frames, channels), resampled to samplerate if given"""
+    with wave.open(filename, 'rb') as wf:
+        n_channels = wf.getnchannels()
+        framerate = wf.getframerate()
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    audio = audio.reshape(-1, n_channels).astype(np.float32) / 32768.0
+
+    if samplerate and samplerate != framerate:
+        audio = resample(audio, framerate, samplerate)
+        framerate = samplerate
+    return audio, framerate
+
+
+def resample(audio, from_rate, to_rate):
+    """Resample float32 audio along its first axis"""
+    if from_rate == to_rate:
+        return audio
+    factor = gcd(to_rate, from_rate)
+    return resample_poly(audio, to_rate // factor, from_rate // factor, axis=0).astype(np.float32)
+
+
+class DuplexAudioEngine:
+    def __init__(self, samplerate=DEFAULT_SAMPLE_RATE, blocksize=DEFAULT_BLOCKSIZE,
+                 input_channels=1, output_channels=2, latency='low', device=None):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.input_channels = input_channels
+        self.output_channels = output_channels
+        self.latency = latency
+        self.device = device
+
+        self._stream = None
+        self._lock = threading.Lock()
+        self._backing = np.zeros((0, output_channels), dtype=np.float32)
+        self._play_pos = 0
+        self._backing_started = None  # frame index of the block the backing started in
+        self._ring = np.zeros((0, input_channels), dtype=np.float32)
+        self.first_block_time = None  # (first frame index, input ADC time, output DAC time)
+        self.block_times = deque(maxlen=BLOCK_TIMES_KEPT)  # the same, for recent blocks
+        self.frames_processed = 0
+        self.xruns = 0
+        self.reported_latency = (0.0, 0.0)  # (input, output) seconds from the last stream
+
+    # -- backing track --------------------------------------------------
+
+    def load_backing(self, audio):
+        """
+        Set the track to play: float32 array of shape (frames,) or (frames, channels).
+        On a running stream it starts with the next block.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim == 1:
+            audio = audio[:, None]
+        if audio.shape[1] != self.output_channels:
+            # Mono to stereo (or down-mix) so the callback can copy straight through
+            audio = np.repeat(audio.mean(axis=1, keepdims=True), self.output_channels, axis=1)
+        with self._lock:
+            self._backing = np.ascontiguousarray(audio)
+            self._play_pos = 0
+            self._backing_started = None
+
+    def load_backing_file(self, filename):
+        audio, _ = load_wav(filename, self.samplerate)
+        self.load_backing(audio)
+
+    def stop_backing(self):
+        """Silence the output; capture carries on"""
+        self.load_backing(np.zeros((0, self.output_channels), dtype=np.float32))
+
+    @property
+    def backing_seconds(self):
+        return len(self._backing) / self.samplerate
+
+    # -- stream -----------------------------------------------------------
+
+    def _write_capture(self, indata, frames):
+        capacity = len(self._ring)
+        if frames > capacity:
+            indata = indata[frames - capacity:]
+        start = (self.frames_processed + frames - len(indata)) % capacity
+        first = min(len(indata), capacity - start)
+        self._ring[start:start + first] = indata[:first]
+        self._ring[:len(indata) - first] = indata[first:]
+
+    def _callback(self, indata, outdata, frames, time_info, status):
+        if status:
+            self.xruns += 1
+
+        block_time = (self.frames_processed, time_info.inputBufferAdcTime, time_info.outputBufferDacTime)
+        if self.first_block_time is None:
+            self.first_block_time = block_time
+        self.block_times.append(block_time)
+
+        with self._lock:
+            chunk = self._backing[self._play_pos:self._play_pos + frames]
+            if len(chunk) and self._backing_started is None:
+                self._backing_started = self.frames_processed
+            self._play_pos += len(chunk)
+            self._write_capture(indata, frames)
+            self.frames_processed += frames
+        outdata[:len(chunk)] = chunk
+        outdata[len(chunk):] = 0
+
+    def start(self, capture_seconds=DEFAULT_CAPTURE_SECONDS):
+        """
+        Open the duplex stream; output and input start on the same callback
+        clock. The capture ring holds the last capture_seconds of input.
+        """
+        if self._stream is not None:
+            if self._stream.active:
+                return
+            self.close()  # the stream ended on its own (e.g. a device error)
+        capacity = max(int(capture_seconds * self.samplerate), 8 * self.blocksize)
+        self._ring = np.zeros((capacity, self.input_channels), dtype=np.float32)
+        self.first_block_time = None
+        self.block_times.clear()
+        self.frames_processed = 0
+        self.xruns = 0
+        with self._lock:
+            self._backing_started = None
+        self._stream = sd.Stream(
+            samplerate=self.samplerate,
+            blocksize=self.blocksize,
+            dtype='float32',
+            channels=(self.input_channels, self.output_channels),
+            latency=self.latency,
+            device=self.device,
+            callback=self._callback
+        )
+        self._stream.start()
+
+    def close(self):
+        """Close the stream; the capture stays readable until the next start()"""
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self.reported_latency = self._stream.latency
+            self._stream = None
+
+    def stop(self):
+        """Close the stream and return the raw capture (frames, input_channels)"""
+        self.close()
+        return self.capture()
+
+    @property
+    def is_active(self):
+        return self._stream is not None and self._stream.active
+
+    @property
+    def playback_finished(self):
+        return self._play_pos >= len(self._backing)
+
+    def capture(self, since=0):
+        """
+        Input from frame index since up to now, (frames, input_channels). Frames
+        the ring has already overwritten are left out; see capture_range().
+        """
+        return self.capture_range(since)[1]
+
+    def capture_range(self, since=0):
+        """(index of the first frame returned, capture from there up to now)"""
+        with self._lock:
+            end = self.frames_processed
+            capacity = len(self._ring)
+            start = min(max(since, end - capacity, 0), end)
+            if start == end:
+                return start, np.zeros((0, self.input_channels), dtype=np.float32)
+            return start, self._ring[np.arange(start, end) % capacity]
+
+    # -- alignment ----------------------------------------------------------
+
+    def alignment_offset(self):
+        """
+        Capture frame index of the first backing sample leaving the speakers:
+        the frame the backing started in plus the DAC-minus-ADC time of the
+        stream's first block. Falls back to the stream's nominal latency when the
+        host API reports no timestamps.
+        """
+        started = self._backing_started or 0
+        if self.first_block_time:
+            _, adc_time, dac_time = self.first_block_time
+            if adc_time and dac_time:
+                return started + int(round((dac_time - adc_time) * self.samplerate))
+
+        stream = self._stream
+        input_latency, output_latency = stream.latency if stream is not None else self.reported_latency
+        return started + int(round((input_latency + output_latency) * self.samplerate))
+
+    def aligned_capture(self):
+        """Capture trimmed/padded so sample i lines up with backing sample i"""
+        offset = self.alignment_offset()
+        start, captured = self.capture_range(max(offset, 0))
+        if start <= offset:
+            return captured
+        padding = np.zeros((start - offset, captured.shape[1]), dtype=captured.dtype)
+        return np.concatenate([padding, captured])
+
+    def measure_round_trip(self, duration=1.0, click_at=0.25):
+        """
+        Play a short click and locate it in the input. Needs the mic to hear the
+        speakers (or a loopback cable). Returns the measured round trip and the
+        latency PortAudio reports, both in seconds.
+        """
+        frames = int(duration * self.samplerate)
+        click_frame = int(click_at * self.samplerate)
+        click = np.zeros(frames, dtype=np.float32)
+        click[click_frame:click_frame + 64] = np.hanning(64).astype(np.float32) * 0.8
+
+        self.load_backing(click)
+        self.start(capture_seconds=duration + 0.5)
+        sd.sleep(int(duration * 1000) + 100)
+        captured = self.stop()[:, 0]
+
+        # Output frame n and input frame n share one callback, so the peak's
+        # distance from the click frame is the full speaker-to-mic round trip
+        peak = int(np.argmax(np.abs(captured)))
+        round_trip = (peak - click_frame) / self.samplerate if np.abs(captured).max() > 0.01 else None
+        input_latency, output_latency = self.reported_latency
+        return {
+            'round_trip': round_trip,
+            'reported_round_trip': input_latency + output_latency,
+            'blocksize': self.blocksize,
+            'xruns': self.xruns
+        }
+
+
+if __name__ == "__main__":
+    engine = DuplexAudioEngine()
+    print("Measuring round-trip latency (turn speakers up so the mic hears the click)...")
+    result = engine.measure_round_trip()
+    if result['round_trip'] is None:
+        print("⚠️ Click not detected in the input")
+    else:
+        print(f"Measured round trip: {result['round_trip'] * 1000:.1f} ms")
+    print(f"Reported by PortAudio: {result['reported_round_trip'] * 1000:.1f} ms "
+          f"(blocksize {result['blocksize']}, {result['xruns']} xruns)")
@@ -1,11 +1,14 @@
 import whisper
 import sounddevice as sd
-import numpy as np
 import wave
 import os
 import json
-from scipy.signal import resample_poly
-from math import gcd
+import pygame
+from time_stretch import play_audio_with_speed  # streaming, pitch-preserving
+from song_catalog import SongCatalog
+from local_audio_index import LocalAudioIndex
+from pcm_cache import PcmCache
+from rendition_cache import RenditionCache
 
 # -----------------------------
 # Parameters
@@ -14,6 +17,7 @@ DURATION = 10  # seconds
 SAMPLE_RATE = 16000  # 16kHz, works best with Whisper
 FILENAME = "temp_audio.wav"
 DATABASE_PATH = "blind-karaoke/src/lib/database/songs.json"
+LOCAL_AUDIO_FOLDER = "local_audio"
 
 # -----------------------------
 # Database Functions
@@ -36,13 +40,9 @@ def save_song_database(database):
     except Exception as e:
         print(f"Error saving database: {e}")
 
-def add_song_to_database(database, title, artist, lyrics, spotify_track_id=None, genre="Unknown", year=2024, difficulty="medium"):
-    """Add a new song to the database"""
-    # Generate new ID
-    new_id = max([song.get("id", 0) for song in database["songs"]], default=0) + 1
-    
+def add_song_to_database(database, title, artist, lyrics, spotify_track_id=None, genre="Unknown", year=2024, difficulty="medium", catalog=None):
+    """Add a new song to the database (pass the menu's catalog to keep its stats current)"""
     new_song = {
-        "id": new_id,
         "title": title,
         "artist": artist,
         "lyrics": lyrics,
@@ -52,8 +52,9 @@ def add_song_to_database(database, title, artist, lyrics, spotify_track_id=None,
         "difficulty": difficulty
     }
     
-    database["songs"].append(new_song)
-    return new_song
+    if catalog is None:
+        catalog = SongCatalog(database["songs"])
+    return catalog.add(new_song)
 
 def search_songs(database, query):
     """Search songs by title or artist"""
@@ -84,68 +85,11 @@ def list_all_songs(database):
         print(f"    Lyrics: {song['lyrics'][:100]}{'...' if len(song['lyrics']) > 100 else ''}")
         print()
 
-def get_database_stats(database):
-    """Get database statistics"""
-    songs = database["songs"]
-    genres = {}
-    difficulties = {}
-    years = []
-    
-    for song in songs:
-        # Count genres
-        genre = song.get("genre", "Unknown")
-        genres[genre] = genres.get(genre, 0) + 1
-        
-        # Count difficulties
-        difficulty = song.get("difficulty", "medium")
-        difficulties[difficulty] = difficulties.get(difficulty, 0) + 1
-        
-        # Collect years
-        years.append(song.get("year", 2024))
-    
-    return {
-        "total_songs": len(songs),
-        "genres": genres,
-        "difficulties": difficulties,
-        "year_range": {"min": min(years), "max": max(years)} if years else {"min": 0, "max": 0}
-    }
-
-# -----------------------------
-# Function: Play WAV at custom speed
-# -----------------------------
-def play_audio_with_speed(filename, speed=1.0):
-    """
-    Play WAV file at a given speed without excessive scratchiness.
-    speed > 1.0 => faster
-    speed < 1.0 => slower
-    """
-    # Load WAV
-    with wave.open(filename, 'rb') as wf:
-        n_channels = wf.getnchannels()
-        framerate = wf.getframerate()
-        n_frames = wf.getnframes()
-        audio = wf.readframes(n_frames)
-        audio_np = np.frombuffer(audio, dtype=np.int16)
-        if n_channels > 1:
-            audio_np = audio_np.reshape(-1, n_channels)
-
-    # Convert to float32 in [-1, 1]
-    audio_float = audio_np.astype(np.float32) / 32768.0
-
-    # Resample using resample_poly for higher quality
-    up = 1000
-    down = int(1000 * speed)
-    factor = gcd(up, down)
-    up //= factor
-    down //= factor
-    audio_resampled = resample_poly(audio_float, up, down, axis=0)
-
-    # Normalize to avoid clipping
-    audio_resampled /= np.max(np.abs(audio_resampled)) + 1e-9
-
-    # Play audio
-    sd.play(audio_resampled, samplerate=framerate)
-    sd.wait()
+def get_database_stats(database, catalog=None):
+    """Get database statistics (O(1) when the menu's catalog is passed in)"""
+    if catalog is None:
+        catalog = SongCatalog(database["songs"])
+    return catalog.stats.summary()
 
 # -----------------------------
 # Database Management Menu
@@ -153,6 +97,8 @@ def play_audio_with_speed(filename, speed=1.0):
 def database_menu():
     """Interactive database management menu"""
     database = load_song_database()
+    catalog = SongCatalog(database["songs"])
+    renditions = RenditionCache()
     
     while True:
         print("\n" + "="*50)
@@ -164,9 +110,10 @@ def database_menu():
         print("4. View song details")
         print("5. Database statistics")
         print("6. Record and transcribe (karaoke mode)")
-        print("7. Exit")
+        print("7. Practice with a backing track (custom speed)")
+        print("8. Exit")
         
-        choice = input("\nEnter your choice (1-7): ").strip()
+        choice = input("\nEnter your choice (1-8): ").strip()
         
         if choice == "1":
             list_all_songs(database)
@@ -196,7 +143,7 @@ def database_menu():
             difficulty = input("Difficulty (easy/medium/hard, default: medium): ").strip() or "medium"
             
             if title and artist and lyrics:
-                new_song = add_song_to_database(database, title, artist, lyrics, spotify_id, genre, year, difficulty)
+                new_song = add_song_to_database(database, title, artist, lyrics, spotify_id, genre, year, difficulty, catalog)
                 print(f"\n✅ Song added successfully!")
                 print(f"   ID: {new_song['id']}")
                 print(f"   Title: {new_song['title']}")
@@ -229,22 +176,27 @@ def database_menu():
                 print("❌ Please enter a valid song ID!")
                 
         elif choice == "5":
-            stats = get_database_stats(database)
+            stats = get_database_stats(database, catalog)
             print(f"\n--- Database Statistics ---")
             print(f"Total songs: {stats['total_songs']}")
             print(f"Genres: {stats['genres']}")
             print(f"Difficulties: {stats['difficulties']}")
+            print(f"Moods: {stats['moods']}")
             print(f"Year range: {stats['year_range']['min']} - {stats['year_range']['max']}")
+            print(f"Lyric lengths (words): {stats['lyric_lengths']}")
             
         elif choice == "6":
             karaoke_mode(database)
             
         elif choice == "7":
+            practice_mode(catalog, renditions)
+            
+        elif choice == "8":
             print("👋 Goodbye!")
             break
             
         else:
-            print("❌ Invalid choice! Please enter 1-7.")
+            print("❌ Invalid choice! Please enter 1-8.")
 
 def karaoke_mode(database):
     """Record, transcribe, and show database info (without comparison)"""
@@ -290,5 +242,50 @@ def karaoke_mode(database):
     os.remove(FILENAME)
     print("Temporary audio file deleted.")
 
+def practice_mode(catalog, renditions):
+    """Play a song's local backing track at user-chosen speeds"""
+    print("\n--- Practice Mode ---")
+    try:
+        song_id = int(input("Enter song ID: ").strip())
+    except ValueError:
+        print("❌ Please enter a valid song ID!")
+        return
+
+    song = catalog.get(song_id)
+    if not song:
+        print("❌ Song not found!")
+        return
+
+    path = LocalAudioIndex(LOCAL_AUDIO_FOLDER).find_for_song(song)
+    if not path:
+        print(f"❌ No backing track for '{song['title']}' in {LOCAL_AUDIO_FOLDER}/")
+        return
+
+    if not path.lower().endswith(".wav"):
+        # The stretcher reads 16-bit WAV; decode MP3/OGG/M4A once through the PCM cache
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        print("Decoding backing track...")
+        path = PcmCache().decode(path)
+        if not path:
+            print("❌ Could not decode the backing track")
+            return
+
+    # Render the preset speeds in the background while the user practices
+    renditions.schedule(path)
+    print(f"Preset speeds (instant once rendered): {', '.join(f'{s}x' for s in renditions.speeds)}")
+
+    while True:
+        answer = input("\nEnter playback speed (blank to stop): ").strip()
+        if not answer:
+            break
+        try:
+            speed = float(answer)
+        except ValueError:
+            print("❌ Please enter a number like 0.9 or 1.1")
+            continue
+        print(f"Playing {song['title']} at {speed}x speed...")
+        renditions.play(path, speed)
+
 if __name__ == "__main__":
     database_menu()
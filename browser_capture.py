@@ -0,0 +1,174 @@
+"""
+Browser-side vocal capture for the web app.
+
+karaoke.html records the singer with MediaRecorder and uploads the Opus/WebM
+chunks in order while they sing. Each session gets an ffmpeg process that
+decodes the chunks as they arrive into 16 kHz mono 16-bit PCM, the format
+Whisper takes, so when the singer stops the audio is already decoded and goes
+straight to AudioTranscriber.transcribe_pcm(). The server's own microphone is
+not involved, so one server can take many remote singers at once.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from functools import partial
+
+import numpy as np
+
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+CAPTURE_SAMPLE_RATE = 16000
+MAX_CAPTURE_SECONDS = 10 * 60  # decoded audio kept per session
+MAX_CHUNK_BYTES = 1024 * 1024
+MAX_CAPTURE_SESSIONS = 64
+CAPTURE_IDLE_TIMEOUT = 120.0  # seconds without an upload before a capture is dropped
+LEVEL_INTERVAL = 0.25  # seconds of decoded audio between on_audio callbacks
+
+
+class CaptureError(Exception):
+    pass
+
+
+class CaptureStream:
+    """One session's incremental WebM/Opus -> PCM decoder"""
+
+    def __init__(self, sample_rate=CAPTURE_SAMPLE_RATE, max_seconds=MAX_CAPTURE_SECONDS, on_audio=None):
+        self.sample_rate = sample_rate
+        self.on_audio = on_audio  # on_audio(seconds decoded, RMS level 0..1) as audio arrives
+        self._level_bytes = int(LEVEL_INTERVAL * sample_rate) * 2
+        self._reported_bytes = 0
+        self.max_bytes = max_seconds * sample_rate * 2
+        self.next_seq = 0
+        self.last_activity = time.monotonic()
+        self._pcm = bytearray()
+        self._lock = threading.Lock()
+        self._process = subprocess.Popen(
+            [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+             "-i", "pipe:0",
+             "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate),
+             "pipe:1"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        # Drain ffmpeg's output continuously so its pipe never fills and stalls uploads
+        self._reader = threading.Thread(target=self._read_pcm, daemon=True)
+        self._reader.start()
+
+    def _read_pcm(self):
+        stdout = self._process.stdout
+        while True:
+            data = stdout.read1(65536)
+            if not data:
+                break
+            with self._lock:
+                room = self.max_bytes - len(self._pcm)
+                if room > 0:
+                    self._pcm.extend(data[:room])
+                fresh = None
+                if self.on_audio and len(self._pcm) - self._reported_bytes >= self._level_bytes:
+                    fresh = np.frombuffer(bytes(self._pcm[self._reported_bytes:]), dtype=np.int16)
+                    self._reported_bytes = len(self._pcm)
+            if fresh is not None:
+                level = float(np.sqrt(np.mean((fresh.astype(np.float32) / 32768.0) ** 2)))
+                self.on_audio(self.seconds, level)
+
+    @property
+    def seconds(self):
+        return len(self._pcm) / (2 * self.sample_rate)
+
+    def feed(self, seq, chunk):
+        """Pass the next chunk to the decoder; chunks must arrive in recorder order"""
+        if seq != self.next_seq:
+            raise CaptureError(f"Expected chunk {self.next_seq}, got {seq}")
+        if len(chunk) > MAX_CHUNK_BYTES:
+            raise CaptureError("Chunk too large")
+        try:
+            self._process.stdin.write(chunk)
+            self._process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            raise CaptureError("Decoder is not running")
+        self.next_seq += 1
+        self.last_activity = time.monotonic()
+
+    def snapshot(self, start=0):
+        """int16 PCM decoded so far from sample `start` on, while the capture continues"""
+        with self._lock:
+            return np.frombuffer(bytes(self._pcm[start * 2:]), dtype=np.int16)
+
+    def finish(self, timeout=10.0):
+        """Close the input, wait for the decoder to flush and return int16 PCM"""
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+        self._reader.join(timeout)
+        self.close()
+        with self._lock:
+            return np.frombuffer(bytes(self._pcm), dtype=np.int16)
+
+    def close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+
+
+class CaptureManager:
+    """Active browser captures keyed by session id"""
+
+    def __init__(self, max_sessions=MAX_CAPTURE_SESSIONS, idle_timeout=CAPTURE_IDLE_TIMEOUT, on_audio=None):
+        self.max_sessions = max_sessions
+        self.on_audio = on_audio  # on_audio(session_id, seconds, level)
+        self.idle_timeout = idle_timeout
+        self.available = shutil.which(FFMPEG_BINARY) is not None
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _reap(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        stale = [sid for sid, stream in self._streams.items() if stream.last_activity < cutoff]
+        for sid in stale:
+            self._streams.pop(sid).close()
+
+    def start(self, session_id):
+        if not self.available:
+            raise CaptureError("Browser capture needs ffmpeg on the server")
+        with self._lock:
+            self._reap()
+            previous = self._streams.pop(session_id, None)
+            if previous:
+                previous.close()
+            if len(self._streams) >= self.max_sessions:
+                raise CaptureError("Too many singers right now, try again shortly")
+            on_audio = partial(self.on_audio, session_id) if self.on_audio else None
+            self._streams[session_id] = CaptureStream(on_audio=on_audio)
+
+    def feed(self, session_id, seq, chunk):
+        with self._lock:
+            stream = self._streams.get(session_id)
+        if stream is None:
+            raise CaptureError("No capture in progress")
+        stream.feed(seq, chunk)
+
+    def snapshot(self, session_id, start=0):
+        """PCM decoded so far (from sample `start` on) for the session's capture, or None"""
+        with self._lock:
+            stream = self._streams.get(session_id)
+        return stream.snapshot(start) if stream else None
+
+    def finish(self, session_id):
+        """Decoded PCM for the session's capture, or None if there was none"""
+        with self._lock:
+            stream = self._streams.pop(session_id, None)
+        return stream.finish() if stream else None
+
+    def buffered_bytes(self):
+        """Decoded PCM held across all active captures"""
+        with self._lock:
+            streams = list(self._streams.values())
+        return sum(len(stream._pcm) for stream in streams)
+
+    def __len__(self):
+        return len(self._streams)
@@ -0,0 +1,157 @@
+"""
+Size-bounded on-disk LRU cache with single-flight population.
+
+Entries are files named by a SHA-256 key inside cache_dir. Hits bump the file's
+mtime so the LRU order survives restarts; once the cache grows past max_bytes
+the least recently used files are deleted. Concurrent get_or_create() calls for
+the same key share one producer run instead of each downloading/decoding.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class DiskLRUCache:
+    def __init__(self, cache_dir, max_bytes, suffix=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._inflight = {}  # key -> Future shared by concurrent producers
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def key_for(text):
+        """Stable cache key for an arbitrary string (URL, file fingerprint, ...)"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def _scan(self):
+        """Rebuild the LRU order from files left by a previous run"""
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file() or not entry.name.endswith(self.suffix) or entry.name.endswith(".tmp"):
+                continue
+            stat = entry.stat()
+            key = entry.name[:len(entry.name) - len(self.suffix)] if self.suffix else entry.name
+            found.append((stat.st_mtime, key, stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def get(self, key):
+        """Return the cached file path for key, or None on a miss"""
+        with self._lock:
+            path = self._lookup_locked(key)
+        if path is None:
+            return None
+        try:
+            now = time.time()
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        return path
+
+    def _lookup_locked(self, key):
+        path = self.path_for(key)
+        if key not in self._entries:
+            return None
+        if not os.path.exists(path):
+            self._total_bytes -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return path
+
+    def _add(self, key, temp_path):
+        path = self.path_for(key)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict_locked(keep=key)
+        return path
+
+    def put(self, key, data):
+        """Store bytes under key and return the cached file path"""
+        temp_path = self.path_for(key) + f".{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        return self._add(key, temp_path)
+
+    def get_or_create(self, key, producer):
+        """
+        Return the cached path for key, running producer(temp_path) on a miss.
+        The producer writes the entry to temp_path and returns True on success.
+        Only one producer runs per key; other callers wait for its result.
+        """
+        path = self.get(key)
+        if path:
+            return path
+
+        with self._lock:
+            # A producer may have finished between get() and here
+            path = self._lookup_locked(key)
+            if path:
+                return path
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_owner:
+            return future.result()
+
+        temp_path = self.path_for(key) + f".{threading.get_ident()}.tmp"
+        try:
+            path = self._add(key, temp_path) if producer(temp_path) else None
+            future.set_result(path)
+            return path
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        """Delete every cached file"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove_locked(key)
+
+    def _remove_locked(self, key):
+        self._total_bytes -= self._entries.pop(key)
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass
+
+    def _evict_locked(self, keep=None):
+        while self._total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                # Never evict the entry that was just added, even if it alone exceeds the cap
+                break
+            self._remove_locked(oldest)
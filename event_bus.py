@@ -0,0 +1,108 @@
+"""
+Per-session push channel for live karaoke updates, served as Server-Sent Events.
+
+Server code publishes events (recording level, partial transcripts, live
+scores, job status) to a session's channel; every open EventSource for that
+session receives them as they happen. Each channel keeps a short history so a
+reconnecting browser (which sends Last-Event-ID) catches up on what it missed.
+Subscribers are plain callbacks, so the same bus feeds blocking Flask
+generators and asyncio queues in the ASGI app.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+CHANNEL_HISTORY = 50  # events replayed to a reconnecting client
+CHANNEL_IDLE_TIMEOUT = 30 * 60  # seconds before a channel with no subscribers is dropped
+KEEPALIVE_INTERVAL = 15.0  # seconds between SSE comments that keep proxies from closing the stream
+
+
+def format_sse(event_id, event, data):
+    """One event in text/event-stream wire format"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Channel:
+    def __init__(self, history=CHANNEL_HISTORY):
+        self.events = deque(maxlen=history)  # (id, event, data)
+        self.subscribers = set()
+        self.next_id = 1
+        self.last_activity = time.monotonic()
+
+
+class EventBus:
+    def __init__(self, history=CHANNEL_HISTORY, idle_timeout=CHANNEL_IDLE_TIMEOUT):
+        self.history = history
+        self.idle_timeout = idle_timeout
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def _channel(self, session_id):
+        channel = self._channels.get(session_id)
+        if channel is None:
+            self._reap()
+            channel = self._channels[session_id] = Channel(self.history)
+        channel.last_activity = time.monotonic()
+        return channel
+
+    def _reap(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for session_id in [sid for sid, channel in self._channels.items()
+                           if not channel.subscribers and channel.last_activity < cutoff]:
+            del self._channels[session_id]
+
+    def publish(self, session_id, event, data=None):
+        """Send an event to every subscriber of the session's channel"""
+        if not session_id:
+            return
+        with self._lock:
+            channel = self._channel(session_id)
+            item = (channel.next_id, event, data)
+            channel.next_id += 1
+            channel.events.append(item)
+            subscribers = list(channel.subscribers)
+        for callback in subscribers:
+            callback(item)
+
+    def subscribe(self, session_id, callback, last_event_id=None):
+        """
+        Register callback(item) for the session's events. Events after
+        last_event_id still in the history are delivered first. Returns a
+        function that unsubscribes.
+        """
+        with self._lock:
+            channel = self._channel(session_id)
+            backlog = [item for item in channel.events
+                       if last_event_id is not None and item[0] > last_event_id]
+            for item in backlog:
+                callback(item)
+            channel.subscribers.add(callback)
+
+        def unsubscribe():
+            with self._lock:
+                channel.subscribers.discard(callback)
+                channel.last_activity = time.monotonic()
+        return unsubscribe
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(channel.subscribers) for channel in self._channels.values())
+
+    def stream(self, session_id, last_event_id=None, keepalive=KEEPALIVE_INTERVAL):
+        """Blocking generator of SSE text for a WSGI response"""
+        pending = queue.Queue()
+        unsubscribe = self.subscribe(session_id, pending.put, last_event_id)
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    item = pending.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(*item)
+        finally:
+            unsubscribe()
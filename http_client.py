@@ -0,0 +1,123 @@
+"""
+Shared pooled HTTP client for outbound calls (Spotify Web API and preview downloads).
+
+One requests.Session keeps TCP/TLS connections alive between calls, applies a
+default timeout so a stalled server cannot hang a request thread, retries
+idempotent requests with exponential backoff (honouring Retry-After on 429),
+and caps how many requests run against a single host at once.
+"""
+
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 15)  # (connect, read) seconds
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.3          # sleeps 0.3s, 0.6s, 1.2s between attempts
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_SIZE = 16                # keep-alive connections kept per host
+PER_HOST_LIMIT = 8            # concurrent in-flight requests per host
+MAX_RETRY_AFTER = 10.0        # longest Retry-After (seconds) honoured before retrying
+
+
+class CappedRetry(Retry):
+    """Retry that honours Retry-After but never sleeps longer than MAX_RETRY_AFTER"""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with a default timeout and a per-host concurrency limit. A
+    request holds its host slot until its body has been read: plain requests
+    read it before send() returns, streamed ones keep the slot until the
+    response is closed.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, per_host_limit=PER_HOST_LIMIT, **kwargs):
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def _host_slot(self, host):
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+        return slot
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        slot = self._host_slot(urlsplit(request.url).netloc)
+        slot.acquire()
+        try:
+            response = super().send(request, **kwargs)
+            if not kwargs.get('stream'):
+                response.content  # read the body while still holding the slot
+        except BaseException:
+            slot.release()
+            raise
+        if not kwargs.get('stream'):
+            slot.release()
+            return response
+
+        # Streamed: release on close(), or when the response is garbage collected unclosed
+        release = weakref.finalize(response, slot.release)
+        close = response.close
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+        response.close = close_and_release
+        return response
+
+
+def create_session(timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES, pool_size=POOL_SIZE,
+                   per_host_limit=PER_HOST_LIMIT):
+    """Build a keep-alive session with timeouts, retries and per-host limits"""
+    retry = CappedRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = PooledHTTPAdapter(
+        timeout=timeout,
+        per_host_limit=per_host_limit,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def get_shared_session():
+    """Process-wide session shared by spotipy and preview downloads"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
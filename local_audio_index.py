@@ -0,0 +1,117 @@
+"""
+Index of the local_audio folder for matching songs to backing tracks.
+
+The folder is scanned once and every file is keyed by a normalized name
+(case, punctuation and accents removed), so "Beyoncé - Halo.MP3" and
+"beyonce halo.mp3" both match. A song's tagged local_audio_file is first
+looked up by its exact file name (ignoring case), extension included, and
+only then by its normalized stem. Song lookups are cached per catalog id and the
+folder is only rescanned when its modification time changes.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.m4a')  # preferred first when names collide
+REFRESH_CHECK_INTERVAL = 2.0  # seconds between directory mtime checks
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name):
+    """Lower-case, accent-free, punctuation-free form of a file or song name"""
+    name = unicodedata.normalize('NFKD', name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    name = name.casefold().replace("&", " and ")
+    return _NON_ALNUM.sub(" ", name).strip()
+
+
+class LocalAudioIndex:
+    def __init__(self, folder="local_audio"):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._files = {}       # normalized stem -> path
+        self._names = {}       # case-folded file name -> path
+        self._song_paths = {}  # catalog id -> path (or None when there is no file)
+        self._folder_mtime = None
+        self._last_check = 0.0
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Rescan the folder if it changed since the last scan"""
+        try:
+            mtime = os.stat(self.folder).st_mtime
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            if not force and mtime == self._folder_mtime:
+                return
+
+            files = {}
+            names = {}
+            if mtime is not None:
+                entries = sorted(os.scandir(self.folder), key=lambda e: e.name)
+                for entry in entries:
+                    stem, ext = os.path.splitext(entry.name)
+                    ext = ext.lower()
+                    if ext not in AUDIO_EXTENSIONS or not entry.is_file():
+                        continue
+                    names[entry.name.casefold()] = entry.path
+                    key = normalize_name(stem)
+                    current = files.get(key)
+                    if current is None or AUDIO_EXTENSIONS.index(ext) < AUDIO_EXTENSIONS.index(os.path.splitext(current)[1].lower()):
+                        files[key] = entry.path
+
+            self._files = files
+            self._names = names
+            self._song_paths = {}
+            self._folder_mtime = mtime
+
+    def _maybe_refresh(self):
+        if time.monotonic() - self._last_check >= REFRESH_CHECK_INTERVAL:
+            self.refresh()
+
+    def _match(self, title, artist, local_audio_file=None):
+        candidates = []
+        if local_audio_file:
+            # The tagged file itself, before any same-named file with another extension
+            path = self._names.get(os.path.basename(local_audio_file).casefold())
+            if path:
+                return path
+            candidates.append(os.path.splitext(local_audio_file)[0])
+        candidates.extend([
+            title,
+            f"{artist} - {title}",
+            f"{title} - {artist}"
+        ])
+        for candidate in candidates:
+            path = self._files.get(normalize_name(candidate))
+            if path:
+                return path
+        return None
+
+    def find(self, title, artist, local_audio_file=None):
+        """Find the local file for a title/artist pair, or None"""
+        self._maybe_refresh()
+        return self._match(title, artist, local_audio_file)
+
+    def find_for_song(self, song):
+        """Find the local file for a catalog song; repeat lookups are one dict access"""
+        self._maybe_refresh()
+        song_id = song['id']
+        if song_id not in self._song_paths:
+            self._song_paths[song_id] = self._match(song['title'], song['artist'], song.get('local_audio_file'))
+        return self._song_paths[song_id]
+
+    def paths(self):
+        """Every indexed audio file"""
+        self._maybe_refresh()
+        return list(self._files.values())
+
+    def __len__(self):
+        return len(self._files)
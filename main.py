@@ -1,4 +1,3 @@
-import json
 import keyboard
 import time
 import threading
@@ -6,22 +5,27 @@ import os
 from Transcriber import AudioTranscriber
 from LyricsComparison import LyricsComparator
 from spotify_stuff import SpotifyController
+from song_catalog import load_songs, SongCatalog
+from local_audio_index import LocalAudioIndex
 
 class KaraokeGame:
     def __init__(self):
         self.songs_database = self.load_songs_database()
+        self.catalog = SongCatalog(self.songs_database)
         self.transcriber = AudioTranscriber()
         self.comparator = LyricsComparator()
         self.spotify = SpotifyController()
         self.current_song = None
         self.is_recording = False
         self.is_playing = False
+        self.playing_backing = False  # local track playing on the transcriber's duplex stream
         self.local_audio_folder = "local_audio"  # Folder for local audio files
+        self.audio_index = LocalAudioIndex(self.local_audio_folder)
+        # Decode local backing tracks in the background so they start instantly
+        self.spotify.pcm_cache.warm(self.audio_index.paths())
 
     def load_songs_database(self):
-        with open('blind-karaoke/src/lib/database/songs.json', 'r') as f:
-            data = json.load(f)
-            return data['songs']
+        return load_songs()
 
     def select_random_song(self):
         import random
@@ -40,10 +44,7 @@ class KaraokeGame:
 
     def get_available_genres(self):
         """Get all unique genres from the songs database"""
-        genres = set()
-        for song in self.songs_database:
-            genres.add(song['genre'])
-        return sorted(list(genres))
+        return self.catalog.stats.genre_list()
 
     def select_random_song_by_genre(self, genre):
         """Select a random song from a specific genre"""
@@ -131,28 +132,7 @@ class KaraokeGame:
 
     def find_local_audio_file(self, song_title, artist):
         """Find local audio file for the song"""
-        if not os.path.exists(self.local_audio_folder):
-            return None
-
-        # Common audio extensions
-        extensions = ['.mp3', '.wav', '.ogg', '.m4a']
-
-        # Try different filename patterns
-        patterns = [
-            f"{song_title}",
-            f"{artist} - {song_title}",
-            f"{song_title} - {artist}",
-            f"{song_title.lower()}",
-            f"{artist.lower()} - {song_title.lower()}"
-        ]
-
-        for pattern in patterns:
-            for ext in extensions:
-                filename = pattern + ext
-                filepath = os.path.join(self.local_audio_folder, filename)
-                if os.path.exists(filepath):
-                    return filepath
-        return None
+        return self.audio_index.find(song_title, artist)
 
     def toggle_music(self, e):
         if not self.current_song:
@@ -161,8 +141,7 @@ class KaraokeGame:
 
         if self.is_playing:
             print("\nStopping music...")
-            self.spotify.pause_playback()
-            self.is_playing = False
+            self.stop_music()
         else:
             print("\nStarting music...")
 
@@ -174,7 +153,10 @@ class KaraokeGame:
 
             if local_file:
                 print(f"Playing local file: {os.path.basename(local_file)}")
-                if self.spotify.play_local_file(local_file):
+                if self.play_backing(local_file):
+                    self.playing_backing = True
+                    self.is_playing = True
+                elif self.spotify.play_local_file(local_file):
                     self.is_playing = True
                 else:
                     print("Failed to play local file")
@@ -192,6 +174,22 @@ class KaraokeGame:
                 print("No audio source available")
                 print("Tip: Add an audio file to the local_audio folder")
 
+    def play_backing(self, local_file):
+        """Play a local track on the recording stream, so the take shares its clock"""
+        if local_file.lower().endswith('.wav'):
+            wav_path = local_file
+        else:
+            wav_path = self.spotify.pcm_cache.get(local_file) or self.spotify.pcm_cache.decode(local_file)
+        return bool(wav_path) and self.transcriber.play_backing(wav_path)
+
+    def stop_music(self):
+        if self.playing_backing:
+            self.transcriber.stop_backing()
+            self.playing_backing = False
+        else:
+            self.spotify.pause_playback()
+        self.is_playing = False
+
     def analyze_performance(self, transcribed_text):
         if not self.current_song:
             return
@@ -221,8 +219,11 @@ class KaraokeGame:
     def cleanup(self):
         if self.is_recording:
             self.transcriber.stop_recording()
-        if self.is_playing:
+        if self.playing_backing:
+            self.transcriber.stop_backing()
+        elif self.is_playing:
             self.spotify.stop_playback()
+        self.transcriber.cleanup()
 
 if __name__ == "__main__":
     game = KaraokeGame()
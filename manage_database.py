@@ -3,12 +3,16 @@
 Simple script to manage the song database JSON file
 """
 
+import csv
 import json
 import os
+import sys
 from datetime import datetime
 
 DATABASE_PATH = "blind-karaoke/src/lib/database/songs.json"
 
+VALID_DIFFICULTIES = ("easy", "medium", "hard")
+
 def load_database():
     """Load the database from JSON file"""
     try:
@@ -199,6 +203,158 @@ def show_database_info():
         print(f"File size: {size_kb:.1f} KB")
         print(f"Last modified: {modified.strftime('%Y-%m-%d %H:%M:%S')}")
 
+def iter_import_records(path):
+    """Stream (line number, record) pairs from a CSV or JSONL dump one row at a time"""
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if extension == ".csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        elif extension in (".jsonl", ".ndjson"):
+            for line_num, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_num, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_num, None
+        else:
+            raise ValueError(f"Unsupported import format: {extension or path} (use .csv or .jsonl)")
+
+def normalize_import_record(record):
+    """Validate a raw import row and return (song fields, error message)"""
+    if not isinstance(record, dict):
+        return None, "malformed row"
+
+    def text(field):
+        value = record.get(field)
+        return str(value).strip() if value is not None else ""
+
+    title = text("title")
+    artist = text("artist")
+    lyrics = text("lyrics")
+    if not title or not artist or not lyrics:
+        return None, "title, artist and lyrics are required"
+
+    year_value = text("year")
+    try:
+        year = int(year_value) if year_value else 2024
+    except ValueError:
+        return None, f"invalid year '{year_value}'"
+
+    difficulty = text("difficulty").lower() or "medium"
+    if difficulty not in VALID_DIFFICULTIES:
+        return None, f"invalid difficulty '{difficulty}'"
+
+    moods = record.get("moods") or []
+    if isinstance(moods, str):
+        # CSV dumps carry moods as a single "a;b;c" or "a|b|c" cell
+        moods = moods.replace("|", ";").split(";")
+    moods = [str(mood).strip() for mood in moods if str(mood).strip()]
+
+    song = {
+        "title": title,
+        "artist": artist,
+        "lyrics": lyrics,
+        "spotify_track_id": text("spotify_track_id") or None,
+        "genre": text("genre") or "Unknown",
+        "year": year,
+        "difficulty": difficulty
+    }
+    local_audio_file = text("local_audio_file")
+    if local_audio_file:
+        song["local_audio_file"] = local_audio_file
+    if moods:
+        song["moods"] = moods
+    return song, None
+
+def _song_key(song):
+    """Deduplication key for a song: case-insensitive (title, artist)"""
+    return (song.get("title", "").strip().casefold(), song.get("artist", "").strip().casefold())
+
+def _write_song_entry(f, song, first):
+    """Write one song to an open songs array, matching json.dump(indent=2) layout"""
+    entry = json.dumps(song, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+    f.write(("\n    " if first else ",\n    ") + entry)
+
+def bulk_import(path, max_errors_shown=10):
+    """Stream songs from a CSV/JSONL dump into the database with a single write at the end"""
+    if not os.path.exists(path):
+        print(f"❌ Import file not found: {path}")
+        return None
+
+    if os.path.exists(DATABASE_PATH):
+        database = load_database()
+        if database is None:
+            # Never replace a database we could not read with just the imported rows
+            print("❌ Import aborted: the existing database could not be loaded and was left untouched")
+            return None
+    else:
+        database = {"songs": []}
+    existing_songs = database.get("songs", [])
+
+    # Only the dedupe keys are held in memory; imported songs go straight to disk
+    seen = {_song_key(song) for song in existing_songs}
+    next_id = max((song.get("id", 0) for song in existing_songs), default=0) + 1
+    imported = duplicates = rejected = 0
+
+    os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+    temp_path = DATABASE_PATH + ".import.tmp"
+
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as out:
+            out.write('{\n  "songs": [')
+            first = True
+            for song in existing_songs:
+                _write_song_entry(out, song, first)
+                first = False
+
+            for line_num, record in iter_import_records(path):
+                song, error = normalize_import_record(record)
+                if error:
+                    rejected += 1
+                    if rejected <= max_errors_shown:
+                        print(f"⚠️ Line {line_num}: {error}")
+                    continue
+
+                key = _song_key(song)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+
+                _write_song_entry(out, {"id": next_id, **song}, first)
+                first = False
+                next_id += 1
+                imported += 1
+
+            out.write("\n  ]\n}" if not first else "]\n}")
+
+        os.replace(temp_path, DATABASE_PATH)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"❌ Import failed: {e}")
+        return None
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    if rejected > max_errors_shown:
+        print(f"⚠️ ... and {rejected - max_errors_shown} more invalid rows")
+    print(f"✅ Imported {imported} songs ({duplicates} duplicates skipped, {rejected} invalid rows)")
+    return {"imported": imported, "duplicates": duplicates, "rejected": rejected}
+
+def bulk_import_interactive():
+    """Prompt for a CSV/JSONL file and bulk import it"""
+    print("\n--- Bulk Import ---")
+    path = input("Path to CSV or JSONL file: ").strip()
+    if not path:
+        print("❌ Please enter a file path!")
+        return None
+    return bulk_import(path)
+
 def main():
     """Main menu"""
     while True:
@@ -209,9 +365,10 @@ def main():
         print("2. Search songs")
         print("3. Add new song")
         print("4. Database statistics")
-        print("5. Exit")
+        print("5. Bulk import (CSV/JSONL)")
+        print("6. Exit")
         
-        choice = input("\nEnter your choice (1-5): ").strip()
+        choice = input("\nEnter your choice (1-6): ").strip()
         
         if choice == "1":
             list_songs()
@@ -222,10 +379,15 @@ def main():
         elif choice == "4":
             show_database_info()
         elif choice == "5":
+            bulk_import_interactive()
+        elif choice == "6":
             print("👋 Goodbye!")
             break
         else:
-            print("❌ Invalid choice! Please enter 1-5.")
+            print("❌ Invalid choice! Please enter 1-6.")
 
 if __name__ == "__main__":
+    # Non-interactive usage: python manage_database.py import <file.csv|file.jsonl>
+    if len(sys.argv) == 3 and sys.argv[1] == "import":
+        sys.exit(0 if bulk_import(sys.argv[2]) else 1)
     main()
@@ -0,0 +1,309 @@
+"""
+Per-component memory accounting, with budgets enforced by shedding caches.
+
+Components register how to measure themselves and, when what they hold can be
+rebuilt (prefetched audio, response caches, trace history), how to drop it:
+
+    memory_budget.register("prefetched_audio", game.prefetched_bytes,
+                           shed=game.drop_prefetched, priority=10)
+
+report() lists each component's bytes next to the process's current and peak
+RSS. With KARAOKE_TRACEMALLOC=1 it also includes Python's own current/peak
+allocations and the top allocation sites (this slows allocation down, so it is
+off by default).
+
+Budgets are in megabytes:
+
+    KARAOKE_MEMORY_BUDGET_MB=1500                         whole-process RSS
+    KARAOKE_MEMORY_BUDGETS=prefetched_audio=256           single components
+
+When either is set, a watchdog thread checks every
+KARAOKE_MEMORY_CHECK_INTERVAL seconds. A component over its own budget is shed.
+When RSS is over the process budget, sheddable components are shed in priority
+order (lowest first) until RSS drops back under it. The caches go, and the
+container's OOM killer does not take the whole worker.
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MEMORY_BUDGET_ENV = "KARAOKE_MEMORY_BUDGET_MB"
+COMPONENT_BUDGETS_ENV = "KARAOKE_MEMORY_BUDGETS"
+TRACEMALLOC_ENV = "KARAOKE_TRACEMALLOC"
+CHECK_INTERVAL = float(os.environ.get("KARAOKE_MEMORY_CHECK_INTERVAL", "5"))
+TRACEMALLOC_FRAMES = 10  # stack depth kept per allocation
+TOP_ALLOCATIONS = 15
+EXHAUSTED_BACKOFF = 60.0  # seconds between RSS-budget shedding rounds once nothing is left to shed
+MB = 1024 * 1024
+
+
+# -- process-level numbers ----------------------------------------------------------
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Highest RSS this process has reached, in bytes, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_libc = None
+if sys.platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+        _libc.malloc_trim  # glibc only
+    except (OSError, AttributeError):
+        _libc = None
+
+
+def release_freed_memory():
+    """Collect garbage and hand freed heap pages back to the OS so RSS actually drops"""
+    gc.collect()
+    if _libc is not None:
+        _libc.malloc_trim(0)
+
+
+# -- size helpers -------------------------------------------------------------------
+
+def buffer_bytes(obj):
+    """Bytes held by an audio buffer: numpy array, bytes/bytearray, BytesIO or None"""
+    if obj is None:
+        return 0
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if hasattr(obj, 'getbuffer'):
+        return obj.getbuffer().nbytes
+    return len(obj)
+
+
+def model_bytes(model):
+    """Parameter and buffer bytes of a torch module such as a Whisper model"""
+    if model is None:
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def parse_budgets(text):
+    """Parse "name=MB,name=MB" into {name: bytes}"""
+    budgets = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        name, _, megabytes = item.partition("=")
+        try:
+            budgets[name.strip()] = int(float(megabytes) * MB)
+        except ValueError:
+            raise ValueError(f"Bad memory budget '{item}' (expected name=megabytes)")
+    return budgets
+
+
+# -- accountant ---------------------------------------------------------------------
+
+class Component:
+    def __init__(self, name, size, shed=None, priority=100, budget=None):
+        self.name = name
+        self.size = size  # size() -> bytes, or None when not measurable
+        self.shed = shed  # shed() drops whatever can be rebuilt later
+        self.priority = priority  # lower is shed first
+        self.budget = budget
+        self.sheds = 0
+
+    def measure(self):
+        if self.size is None:
+            return None
+        try:
+            return self.size()
+        except Exception as e:
+            print(f"Warning: Could not measure memory of {self.name}: {e}")
+            return None
+
+
+class MemoryAccountant:
+    def __init__(self, budget=None, component_budgets=None):
+        self.budget = budget  # RSS limit in bytes, or None
+        self.component_budgets = dict(component_budgets or {})
+        self.components = {}
+        self.last_shed = None  # (time, component, reason)
+        self.exhausted_until = None  # monotonic time before which RSS shedding is not retried
+        self._lock = threading.Lock()
+        self._enforce_lock = threading.Lock()
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    def register(self, name, size, shed=None, priority=100):
+        component = Component(name, size, shed, priority, self.component_budgets.get(name))
+        with self._lock:
+            self.components[name] = component
+        metrics.MEMORY_COMPONENT_BYTES.labels(name).set_function(component.measure)
+        return component
+
+    def shed(self, name, reason="manual"):
+        """Drop a component's rebuildable memory; returns the bytes it reported before"""
+        component = self.components[name]
+        if component.shed is None:
+            return 0
+        before = component.measure() or 0
+        try:
+            component.shed()
+        except Exception as e:
+            print(f"Warning: Could not shed {name}: {e}")
+            return 0
+        component.sheds += 1
+        self.last_shed = (time.time(), name, reason)
+        metrics.MEMORY_SHEDS.labels(name, reason).inc()
+        print(f"Memory: shed {name} ({before / MB:.1f} MB, {reason})")
+        return before
+
+    def enforce(self):
+        """Shed components over their own budget, then more until RSS is under the process budget"""
+        if not self._enforce_lock.acquire(blocking=False):
+            return []  # another thread is already shedding
+        try:
+            shed = []
+            for component in list(self.components.values()):
+                if component.budget is None or component.shed is None:
+                    continue
+                size = component.measure()
+                if size is not None and size > component.budget:
+                    self.shed(component.name, "component_budget")
+                    shed.append(component.name)
+            if shed:
+                release_freed_memory()
+
+            if self.budget is None:
+                return shed
+            rss = current_rss()
+            if rss is None or rss <= self.budget:
+                self.exhausted_until = None
+                return shed
+            if self.exhausted_until is not None and time.monotonic() < self.exhausted_until:
+                return shed  # shedding already ran dry; no point in collecting again every tick
+            candidates = sorted((c for c in self.components.values() if c.shed is not None),
+                                key=lambda c: c.priority)
+            for component in candidates:
+                if component.name in shed or component.measure() == 0:
+                    continue
+                self.shed(component.name, "rss_budget")
+                shed.append(component.name)
+                release_freed_memory()
+                rss = current_rss()
+                if rss is None or rss <= self.budget:
+                    self.exhausted_until = None
+                    break
+            else:
+                if self.exhausted_until is None:
+                    print(f"Warning: RSS {rss / MB:.0f} MB is over the {self.budget / MB:.0f} MB budget "
+                          f"with nothing left to shed")
+                self.exhausted_until = time.monotonic() + EXHAUSTED_BACKOFF
+            return shed
+        finally:
+            self._enforce_lock.release()
+
+    def report(self, top=TOP_ALLOCATIONS):
+        components = {}
+        for name, component in list(self.components.items()):
+            components[name] = {
+                'bytes': component.measure(),
+                'budget_bytes': component.budget,
+                'sheddable': component.shed is not None,
+                'sheds': component.sheds
+            }
+        report = {
+            'rss_bytes': current_rss(),
+            'peak_rss_bytes': peak_rss(),
+            'budget_bytes': self.budget,
+            'budget_exhausted': self.exhausted_until is not None,
+            'components': components,
+            'last_shed': None
+        }
+        if self.last_shed:
+            at, name, reason = self.last_shed
+            report['last_shed'] = {'time': at, 'component': name, 'reason': reason}
+        if tracemalloc.is_tracing():
+            report['tracemalloc'] = tracemalloc_report(top)
+        return report
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.enforce()
+            except Exception as e:
+                print(f"Warning: Memory budget check failed: {e}")
+
+    def start_watchdog(self, interval=CHECK_INTERVAL):
+        """Check budgets in the background; does nothing when no budget is configured"""
+        if self._watchdog or (self.budget is None and not self.component_budgets):
+            return
+        self._watchdog = threading.Thread(target=self._watch, args=(interval,),
+                                          name="memory-budget", daemon=True)
+        self._watchdog.start()
+
+    def stop_watchdog(self):
+        self._stop.set()
+
+
+def tracemalloc_report(top=TOP_ALLOCATIONS):
+    """Python-level current/peak allocation and the biggest allocation sites"""
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")
+    ])
+    sites = []
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        sites.append({'where': f"{frame.filename}:{frame.lineno}", 'bytes': stat.size, 'count': stat.count})
+    return {'current_bytes': current, 'peak_bytes': peak, 'top': sites}
+
+
+_budget_mb = os.environ.get(MEMORY_BUDGET_ENV)
+ACCOUNTANT = MemoryAccountant(
+    budget=int(float(_budget_mb) * MB) if _budget_mb else None,
+    component_budgets=parse_budgets(os.environ.get(COMPONENT_BUDGETS_ENV))
+)
+
+if os.environ.get(TRACEMALLOC_ENV) == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+metrics.MEMORY_RSS_BYTES.set_function(current_rss)
+metrics.MEMORY_PEAK_RSS_BYTES.set_function(peak_rss)
+
+
+def register(name, size, shed=None, priority=100):
+    return ACCOUNTANT.register(name, size, shed, priority)
+
+
+def report(top=TOP_ALLOCATIONS):
+    return ACCOUNTANT.report(top)
+
+
+def enforce():
+    return ACCOUNTANT.enforce()
+
+
+def start_watchdog(interval=CHECK_INTERVAL):
+    ACCOUNTANT.start_watchdog(interval)
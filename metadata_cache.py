@@ -0,0 +1,105 @@
+"""
+Persistent TTL cache for Spotify metadata (track lookups and preview searches).
+
+Values are kept in memory and flushed to a JSON file so repeat plays after a
+restart still make no API calls. A cached None is a negative entry, e.g. "this
+song has no preview anywhere"; negative entries use their own, shorter TTL.
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+METADATA_CACHE_PATH = ".spotify_metadata.json"
+DEFAULT_TTL = 7 * 24 * 3600        # track metadata rarely changes
+DEFAULT_NEGATIVE_TTL = 24 * 3600   # re-check missing previews once a day
+SAVE_INTERVAL = 5.0                # seconds between flushes to disk
+
+# Returned by lookup() when a key is absent or expired (None is a valid cached value)
+MISS = object()
+
+
+class MetadataCache:
+    def __init__(self, path=METADATA_CACHE_PATH, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = {}  # key -> [expires_at, value]
+        self._dirty = False
+        self._last_save = 0.0
+
+        self._load()
+        atexit.register(self.save)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable metadata cache: {e}")
+            return
+
+        now = time.time()
+        self._entries = {key: entry for key, entry in entries.items() if entry[0] > now}
+
+    def lookup(self, key):
+        """Return the cached value for key, or MISS"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISS
+            if entry[0] <= time.time():
+                del self._entries[key]
+                self._dirty = True
+                return MISS
+            return entry[1]
+
+    def store(self, key, value, ttl=None):
+        """Cache value under key; None records a negative entry"""
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._entries[key] = [time.time() + ttl, value]
+            self._dirty = True
+            due = time.time() - self._last_save >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._dirty = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        """Flush entries to disk if anything changed since the last save"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = dict(self._entries)
+                self._dirty = False
+                self._last_save = time.time()
+
+            # Unique per writer: several worker processes may flush the same cache file
+            temp_path = None
+            try:
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Warning: Could not save metadata cache: {e}")
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
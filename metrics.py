@@ -0,0 +1,306 @@
+"""
+In-process metrics exposed in the Prometheus text format at /metrics.
+
+Counters, gauges and histograms are registered once at import time and
+updated from the hot path with a single lock-protected add; histograms use
+fixed buckets so an observation is a bisect plus two additions. Gauges can
+also be backed by a function that is only called when /metrics is scraped
+(session counts, queue depths), which costs nothing between scrapes.
+
+    with WHISPER_DECODE_SECONDS.time():
+        result = model.transcribe(...)
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from tracing import span
+
+# Seconds; spans quick API calls up to multi-minute recordings and decodes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            # Unlabeled metrics expose their zero value before the first update
+            self.labels()
+
+    def labels(self, *values, **kwargs):
+        """The child metric for one combination of label values"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead"""
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return float('nan')
+        return self._value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def timed(self, func):
+        """Decorator form of time()"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.time():
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))  # before the unlabeled child is created
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def timed(self, func):
+        return self._default().timed(func)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """Every registered metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render():
+    return REGISTRY.render()
+
+
+# -- karaoke pipeline metrics ---------------------------------------------------
+
+RECORD_DURATION_SECONDS = histogram(
+    "karaoke_record_duration_seconds", "Length of recorded takes")
+AUDIO_WRITE_SECONDS = histogram(
+    "karaoke_audio_write_seconds", "Time writing recorded audio to a WAV file")
+MODEL_LOAD_SECONDS = histogram(
+    "karaoke_model_load_seconds", "Time loading the Whisper model")
+WHISPER_DECODE_SECONDS = histogram(
+    "karaoke_whisper_decode_seconds", "Time transcribing audio with Whisper", ["source"])
+COMPARE_LYRICS_SECONDS = histogram(
+    "karaoke_compare_lyrics_seconds", "Time scoring a transcript against the lyrics")
+SPOTIFY_API_SECONDS = histogram(
+    "karaoke_spotify_api_seconds", "Latency of Spotify Web API calls", ["call"])
+SPOTIFY_API_ERRORS = counter(
+    "karaoke_spotify_api_errors_total", "Spotify Web API calls that raised", ["call"])
+PREVIEW_DOWNLOAD_SECONDS = histogram(
+    "karaoke_preview_download_seconds", "Time downloading a preview clip into the cache")
+PLAYBACK_START_SECONDS = histogram(
+    "karaoke_playback_start_seconds", "Time from a play call until audio is playing", ["source"])
+TRANSCRIPTIONS = counter(
+    "karaoke_transcriptions_total", "Transcriptions by outcome", ["result"])
+ACTIVE_SESSIONS = gauge(
+    "karaoke_active_sessions", "Sessions currently held by the server", ["kind"])
+QUEUE_DEPTH = gauge(
+    "karaoke_queue_depth", "Tasks waiting in a background worker pool", ["pool"])
+MEMORY_RSS_BYTES = gauge(
+    "karaoke_memory_rss_bytes", "Resident set size of the process")
+MEMORY_PEAK_RSS_BYTES = gauge(
+    "karaoke_memory_peak_rss_bytes", "Highest resident set size the process has reached")
+MEMORY_COMPONENT_BYTES = gauge(
+    "karaoke_memory_component_bytes", "Memory held by one component (model, buffers, caches)", ["component"])
+MEMORY_SHEDS = counter(
+    "karaoke_memory_sheds_total", "Caches dropped to stay within a memory budget", ["component", "reason"])
+
+
+@contextmanager
+def spotify_call(name):
+    """Time a Spotify Web API call (metric and trace span) and count it if it raises"""
+    start = time.perf_counter()
+    try:
+        with span(f"spotify.api.{name}"):
+            yield
+    except Exception:
+        SPOTIFY_API_ERRORS.labels(name).inc()
+        raise
+    finally:
+        SPOTIFY_API_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def track_pool(name, pool):
+    """Report a ThreadPoolExecutor's backlog as karaoke_queue_depth{pool=name}"""
+    QUEUE_DEPTH.labels(name).set_function(pool._work_queue.qsize)
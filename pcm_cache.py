@@ -0,0 +1,101 @@
+"""
+Pre-decoded PCM cache for local backing tracks.
+
+MP3/M4A files are decoded once, in a background thread, into 16-bit WAV files
+at the mixer's sample rate and channel count. pygame can start a WAV with
+practically no decode work, so later plays of the same track start at once.
+The cache directory is kept under a size budget with LRU eviction.
+"""
+
+import os
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from disk_cache import DiskLRUCache
+
+PCM_CACHE_DIR = ".pcm_cache"
+PCM_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # ~25 four-minute stereo tracks at 44.1 kHz
+PCM_DECODE_WORKERS = 1  # decoding is CPU bound; one worker keeps playback smooth
+WARM_BUDGET_FRACTION = 0.5  # share of the cache startup warming may fill; the rest is for tracks played on demand
+DECODE_EXPANSION = 11  # typical decoded WAV / compressed size (44.1 kHz stereo PCM vs a 128 kbps MP3)
+
+
+class PcmCache:
+    def __init__(self, cache_dir=PCM_CACHE_DIR, max_bytes=PCM_CACHE_MAX_BYTES, workers=PCM_DECODE_WORKERS):
+        self.cache = DiskLRUCache(cache_dir, max_bytes, suffix=".wav")
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pcm-decode")
+
+    def _key(self, path):
+        """Key on the source file's identity and the mixer format it was decoded for"""
+        mixer_format = pygame.mixer.get_init()
+        if not mixer_format:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        fingerprint = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{mixer_format}"
+        return self.cache.key_for(fingerprint)
+
+    def get(self, path):
+        """Cached WAV for path, or None if it has not been decoded yet"""
+        if path.lower().endswith(".wav"):
+            return None
+        key = self._key(path)
+        return self.cache.get(key) if key else None
+
+    def decode(self, path):
+        """Decode path into the cache (once, even if called concurrently) and return the WAV path"""
+        key = self._key(path)
+        if not key:
+            return None
+
+        def transcode(temp_path):
+            frequency, size, channels = pygame.mixer.get_init()
+            if abs(size) != 16:
+                # Only the default signed 16-bit mixer format maps directly onto WAV
+                return False
+            raw = pygame.mixer.Sound(path).get_raw()
+            with wave.open(temp_path, 'wb') as wf:
+                wf.setnchannels(channels)
+                wf.setsampwidth(2)
+                wf.setframerate(frequency)
+                wf.writeframes(raw)
+            return True
+
+        try:
+            return self.cache.get_or_create(key, transcode)
+        except Exception as e:
+            print(f"Warning: Could not pre-decode {os.path.basename(path)}: {e}")
+            return None
+
+    def schedule(self, path):
+        """Queue path for background decoding unless it is already cached"""
+        if path.lower().endswith(".wav") or self.get(path):
+            return None
+        return self.pool.submit(self.decode, path)
+
+    def warm(self, paths, budget=None):
+        """
+        Queue tracks in paths for background decoding while their (estimated)
+        decoded size fits in budget, by default part of the cache, so warming a
+        large library never evicts its own entries before they are played.
+        """
+        if budget is None:
+            budget = int(self.cache.max_bytes * WARM_BUDGET_FRACTION)
+        planned = 0
+        for path in paths:
+            if path.lower().endswith(".wav"):
+                continue
+            cached = self.get(path)
+            try:
+                size = os.path.getsize(cached) if cached else os.path.getsize(path) * DECODE_EXPANSION
+            except OSError:
+                continue
+            if planned + size > budget:
+                continue
+            planned += size
+            if not cached:
+                self.pool.submit(self.decode, path)
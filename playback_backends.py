@@ -0,0 +1,248 @@
+"""
+Playback backends for the web apps.
+
+Every backend exposes the SpotifyController methods the apps use
+(prepare_local_file, prepare_track, play_prepared, play_local_file, play_track,
+pause_playback, stop_playback, set_volume) so any of them can be dropped in:
+
+    spotify_app         Spotify app on the user's device, local files through pygame
+    integrated_preview  30-second previews and local files through pygame (default)
+    local               local files only; no Spotify login or network access
+    fake                in-process stand-in with simulated latency, no audio device
+
+Pick one with create_backend(), or the KARAOKE_PLAYBACK_BACKEND environment
+variable, e.g. KARAOKE_PLAYBACK_BACKEND=fake for offline load tests.
+"""
+
+import os
+import random
+import threading
+import time
+
+from metrics import PLAYBACK_START_SECONDS
+
+
+def local_prepared(file_path, file=None):
+    """The prepared-audio dict play_prepared() takes, for a local track"""
+    return {'source': 'local', 'track_id': None, 'label': os.path.basename(file_path),
+            'file': file or file_path, 'data': None}
+
+
+def prepare_local_file(pcm_cache, file_path, wait_for_decode=False):
+    """
+    Get a local audio file ready to play by path: its pre-decoded WAV when
+    cached, otherwise the file itself while the decode runs in the PCM cache's
+    pool. Pass wait_for_decode from background prefetches to hand back the WAV.
+    """
+    if not os.path.isfile(file_path):
+        print(f"Audio file not found: {file_path}")
+        return None
+    decoded = pcm_cache.get(file_path)
+    if decoded:
+        return local_prepared(file_path, file=decoded)
+
+    future = pcm_cache.schedule(file_path)  # None for WAVs, which play as they are
+    if future is not None and wait_for_decode:
+        decoded = future.result()
+    return local_prepared(file_path, file=decoded)
+
+PLAYBACK_BACKEND_ENV = "KARAOKE_PLAYBACK_BACKEND"
+FAKE_LATENCY_ENV = "KARAOKE_FAKE_LATENCY"  # seconds, e.g. "0.05"
+DEFAULT_BACKEND = "integrated_preview"
+DEFAULT_FAKE_LATENCY = 0.05
+
+
+class PlaybackBackend:
+    name = None
+    use_integrated_player = True  # True when Spotify tracks can be prepared ahead of play
+
+    def prepare_local_file(self, file_path, wait_for_decode=False):
+        return None
+
+    def prepare_track(self, track_id, song_title=None, artist=None):
+        return None
+
+    def play_prepared(self, prepared):
+        return False
+
+    def play_local_file(self, file_path):
+        prepared = self.prepare_local_file(file_path)
+        return bool(prepared) and self.play_prepared(prepared)
+
+    def play_track(self, track_id, device_id=None, song_title=None, artist=None):
+        prepared = self.prepare_track(track_id, song_title, artist)
+        return bool(prepared) and self.play_prepared(prepared)
+
+    def pause_playback(self, device_id=None):
+        return True
+
+    def stop_playback(self):
+        return True
+
+    def set_volume(self, volume_percent, device_id=None):
+        return True
+
+    def warm(self, paths):
+        """Get local tracks ready ahead of time (no-op unless the backend decodes)"""
+        pass
+
+
+class SpotifyBackend(PlaybackBackend):
+    """Delegates to a SpotifyController (OAuth, Web API and pygame playback)"""
+
+    def __init__(self, controller=None, **controller_options):
+        if controller is None:
+            from spotify_stuff import SpotifyController
+            controller = SpotifyController(**controller_options)
+        self.controller = controller
+
+    @property
+    def use_integrated_player(self):
+        return self.controller.use_integrated_player
+
+    def prepare_local_file(self, file_path, wait_for_decode=False):
+        return self.controller.prepare_local_file(file_path, wait_for_decode)
+
+    def prepare_track(self, track_id, song_title=None, artist=None):
+        return self.controller.prepare_track(track_id, song_title, artist)
+
+    def play_prepared(self, prepared):
+        return self.controller.play_prepared(prepared)
+
+    def play_local_file(self, file_path):
+        return self.controller.play_local_file(file_path)
+
+    def play_track(self, track_id, device_id=None, song_title=None, artist=None):
+        return self.controller.play_track(track_id, device_id, song_title, artist)
+
+    def pause_playback(self, device_id=None):
+        return self.controller.pause_playback(device_id)
+
+    def stop_playback(self):
+        return self.controller.stop_playback()
+
+    def set_volume(self, volume_percent, device_id=None):
+        return self.controller.set_volume(volume_percent, device_id)
+
+    def warm(self, paths):
+        self.controller.pcm_cache.warm(paths)
+
+
+class IntegratedPreviewBackend(SpotifyBackend):
+    name = "integrated_preview"
+
+
+class SpotifyAppBackend(SpotifyBackend):
+    name = "spotify_app"
+
+    def __init__(self, controller=None, **controller_options):
+        super().__init__(controller, **controller_options)
+        self.controller.use_integrated_player = False
+
+
+class LocalFileBackend(PlaybackBackend):
+    """Plays files from local_audio through pygame; never touches Spotify"""
+    name = "local"
+
+    def __init__(self):
+        import pygame
+        from pcm_cache import PcmCache
+        self._mixer = pygame.mixer
+        if not self._mixer.get_init():
+            self._mixer.init()
+        self.pcm_cache = PcmCache()
+        self.is_playing = False
+
+    def prepare_local_file(self, file_path, wait_for_decode=False):
+        return prepare_local_file(self.pcm_cache, file_path, wait_for_decode)
+
+    def play_prepared(self, prepared):
+        try:
+            with PLAYBACK_START_SECONDS.labels(prepared['source']).time():
+                self._mixer.music.load(prepared['file'])
+                self._mixer.music.play()
+            self.is_playing = True
+            return True
+        except Exception as e:
+            print(f"Error playing local file: {e}")
+            return False
+
+    def pause_playback(self, device_id=None):
+        self._mixer.music.pause()
+        self.is_playing = False
+        return True
+
+    def stop_playback(self):
+        self._mixer.music.stop()
+        self.is_playing = False
+        return True
+
+    def set_volume(self, volume_percent, device_id=None):
+        self._mixer.music.set_volume(max(0, min(100, volume_percent)) / 100.0)
+        return True
+
+    def warm(self, paths):
+        self.pcm_cache.warm(paths)
+
+
+class FakeBackend(PlaybackBackend):
+    """
+    Simulated playback for load tests: preparing and starting sleep for a
+    randomized latency instead of doing I/O, and calls are counted.
+    """
+    name = "fake"
+
+    def __init__(self, latency=DEFAULT_FAKE_LATENCY, jitter=0.5):
+        self.latency = latency
+        self.jitter = jitter  # fraction of latency added or removed at random
+        self._lock = threading.Lock()
+        self.counts = {'prepare': 0, 'play': 0, 'pause': 0, 'stop': 0}
+        self.is_playing = False
+
+    def _simulate(self, operation, scale=1.0):
+        delay = self.latency * scale * (1 + random.uniform(-self.jitter, self.jitter))
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            self.counts[operation] += 1
+
+    def prepare_local_file(self, file_path, wait_for_decode=False):
+        self._simulate('prepare')
+        return local_prepared(file_path)
+
+    def prepare_track(self, track_id, song_title=None, artist=None):
+        self._simulate('prepare')
+        return {'source': 'spotify_preview', 'track_id': track_id,
+                'label': f"{song_title} by {artist}", 'data': b""}
+
+    def play_prepared(self, prepared):
+        with PLAYBACK_START_SECONDS.labels('fake').time():
+            self._simulate('play', 0.1)
+        self.is_playing = True
+        return True
+
+    def pause_playback(self, device_id=None):
+        self._simulate('pause', 0.1)
+        self.is_playing = False
+        return True
+
+    def stop_playback(self):
+        self._simulate('stop', 0.1)
+        self.is_playing = False
+        return True
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (IntegratedPreviewBackend, SpotifyAppBackend, LocalFileBackend, FakeBackend)
+}
+
+
+def create_backend(name=None, **options):
+    """Build the named backend (default: $KARAOKE_PLAYBACK_BACKEND, else integrated_preview)"""
+    name = name or os.environ.get(PLAYBACK_BACKEND_ENV, DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown playback backend '{name}' (choose from {', '.join(BACKENDS)})")
+    if name == FakeBackend.name and 'latency' not in options and os.environ.get(FAKE_LATENCY_ENV):
+        options['latency'] = float(os.environ[FAKE_LATENCY_ENV])
+    return BACKENDS[name](**options)
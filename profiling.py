@@ -0,0 +1,141 @@
+"""
+Opt-in sampling profiler for Flask routes.
+
+Profiling is off unless KARAOKE_PROFILE_ENABLED=1. Then a request is profiled
+when it carries an `X-Profile` header or `?__profile=` query flag, or when it
+is picked at random with probability KARAOKE_PROFILE_RATE (default 0). If
+KARAOKE_PROFILE_TOKEN is set, the header/flag must carry that token;
+otherwise "1" is enough. While it runs, a background thread samples
+the request thread's Python stack every few milliseconds; when the response is
+ready the samples are written as folded stacks ("a;b;c 12" per line), the
+input flamegraph.pl, speedscope and inferno all read, to KARAOKE_PROFILE_DIR.
+The file name is returned in an X-Profile-File header, and only the newest
+KARAOKE_PROFILE_KEEP files are kept. Requests that do not opt in only pay for
+one header lookup.
+
+    install_profiler(app)
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_ENABLED = os.environ.get("KARAOKE_PROFILE_ENABLED") == "1"
+PROFILE_TOKEN = os.environ.get("KARAOKE_PROFILE_TOKEN") or "1"
+PROFILE_DIR = os.environ.get("KARAOKE_PROFILE_DIR", ".profiles")
+PROFILE_RATE = float(os.environ.get("KARAOKE_PROFILE_RATE", "0"))
+PROFILE_KEEP = int(os.environ.get("KARAOKE_PROFILE_KEEP", "200"))  # newest profile files kept
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_FLAG = "__profile"
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack on a timer; cheap enough to leave running for a whole request"""
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()  # folded stack -> sample count
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self.samples
+
+    def write_folded(self, path):
+        """Write the samples in folded-stack format"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def wants_profile():
+    if not PROFILE_ENABLED:
+        return False
+    if PROFILE_TOKEN in (request.headers.get(PROFILE_HEADER), request.args.get(PROFILE_QUERY_FLAG)):
+        return True
+    return PROFILE_RATE > 0 and random.random() < PROFILE_RATE
+
+
+def prune_profiles(output_dir, keep=PROFILE_KEEP):
+    """Delete all but the newest `keep` profile files"""
+    try:
+        entries = [entry for entry in os.scandir(output_dir)
+                   if entry.is_file() and entry.name.endswith(".folded")]
+    except OSError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[keep:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def install_profiler(app, output_dir=PROFILE_DIR):
+    """Add before/after request hooks that profile opted-in requests"""
+
+    @app.before_request
+    def start_profiling():
+        if wants_profile():
+            g._profiler = SamplingProfiler().start()
+
+    @app.after_request
+    def finish_profiling(response):
+        profiler = g.pop('_profiler', None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        os.makedirs(output_dir, exist_ok=True)
+        endpoint = (request.endpoint or "unknown").replace(".", "_")
+        filename = (f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-"
+                    f"{int(profiler.duration * 1000)}ms-{uuid.uuid4().hex[:6]}.folded")
+        try:
+            profiler.write_folded(os.path.join(output_dir, filename))
+            response.headers['X-Profile-File'] = filename
+            prune_profiles(output_dir)
+        except OSError as e:
+            print(f"Warning: Could not write profile {filename}: {e}")
+        return response
+
+    @app.teardown_request
+    def abandon_profiling(exc):
+        # Requests that raised never reach after_request; just stop sampling
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.stop()
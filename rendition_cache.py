@@ -0,0 +1,131 @@
+"""
+Precomputed multi-speed renditions of backing tracks for practice mode.
+
+Each WAV backing track is rendered at every speed in RENDITION_SPEEDS by a
+background process pool (pitch-preserving, via time_stretch) and stored as
+compressed int16 .npz files in a size-bounded DiskLRUCache. play() serves the
+nearest stored rendition immediately and only stretches on the fly for speeds
+that are not in the set (or not rendered yet). Speeds within tolerance of 1.0
+play the source itself, so no 1.0 rendition is ever rendered or stored.
+"""
+
+import os
+import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import sounddevice as sd
+
+from audio_engine import load_wav
+from disk_cache import DiskLRUCache
+from time_stretch import StreamingTimeStretcher, play_audio_with_speed, READ_BLOCK
+
+RENDITION_CACHE_DIR = ".rendition_cache"
+RENDITION_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+RENDITION_SPEEDS = (0.75, 0.9, 1.1, 1.25)
+RENDITION_TOLERANCE = 0.03  # serve a rendition if it is within 3% of the requested speed
+RENDITION_WORKERS = 2
+
+
+def render_rendition(source_path, speed, out_file):
+    """Process-pool worker: stretch a WAV at speed and save it as compressed int16"""
+    with wave.open(source_path, 'rb') as wf:
+        n_channels = wf.getnchannels()
+        framerate = wf.getframerate()
+        stretcher = StreamingTimeStretcher(n_channels, speed)
+        blocks = []
+        while True:
+            frames = wf.readframes(READ_BLOCK)
+            if not frames:
+                break
+            block = np.frombuffer(frames, dtype=np.int16).reshape(-1, n_channels)
+            blocks.append(stretcher.process(block.astype(np.float32) / 32768.0))
+        blocks.append(stretcher.flush())
+
+    audio = np.clip(np.concatenate(blocks), -1.0, 1.0)
+    with open(out_file, 'wb') as f:
+        np.savez_compressed(f, audio=(audio * 32767).astype(np.int16), samplerate=framerate)
+    return True
+
+
+class RenditionCache:
+    def __init__(self, cache_dir=RENDITION_CACHE_DIR, speeds=RENDITION_SPEEDS,
+                 max_bytes=RENDITION_CACHE_MAX_BYTES, workers=RENDITION_WORKERS,
+                 tolerance=RENDITION_TOLERANCE):
+        self.tolerance = tolerance
+        self.speeds = tuple(sorted(s for s in speeds if not self.is_original(s)))
+        self.cache = DiskLRUCache(cache_dir, max_bytes, suffix=".npz")
+        self.workers = workers
+        self._process_pool = None
+        self._pool_lock = threading.Lock()
+        # Threads that wait on the process pool, so callers never block on a render
+        self._render_threads = ThreadPoolExecutor(max_workers=max(1, len(self.speeds)),
+                                                  thread_name_prefix="rendition")
+
+    def _processes(self):
+        with self._pool_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._process_pool
+
+    def _key(self, source_path, speed):
+        stat = os.stat(source_path)
+        fingerprint = f"{os.path.abspath(source_path)}|{stat.st_size}|{stat.st_mtime_ns}|{speed:.3f}"
+        return self.cache.key_for(fingerprint)
+
+    def _render(self, source_path, speed):
+        key = self._key(source_path, speed)
+
+        def produce(temp_path):
+            return self._processes().submit(render_rendition, source_path, speed, temp_path).result()
+
+        try:
+            return self.cache.get_or_create(key, produce)
+        except Exception as e:
+            print(f"Warning: Could not render {os.path.basename(source_path)} at {speed}x: {e}")
+            return None
+
+    def schedule(self, source_path):
+        """Render every configured speed of source_path in the background"""
+        for speed in self.speeds:
+            if not self.cache.get(self._key(source_path, speed)):
+                self._render_threads.submit(self._render, source_path, speed)
+
+    def is_original(self, speed):
+        """True when speed is close enough to 1.0 to play the source as it is"""
+        return abs(speed - 1.0) <= self.tolerance * speed
+
+    def nearest_speed(self, speed):
+        """Closest configured speed within tolerance, or None"""
+        if not self.speeds:
+            return None
+        nearest = min(self.speeds, key=lambda s: abs(s - speed))
+        return nearest if abs(nearest - speed) <= self.tolerance * speed else None
+
+    def get(self, source_path, speed):
+        """(audio float32, samplerate) of the nearest stored rendition, or None"""
+        nearest = self.nearest_speed(speed)
+        if nearest is None:
+            return None
+        path = self.cache.get(self._key(source_path, nearest))
+        if not path:
+            return None
+        with np.load(path) as data:
+            return data['audio'].astype(np.float32) / 32767.0, int(data['samplerate'])
+
+    def play(self, source_path, speed):
+        """Play source_path at speed, from a stored rendition when one is close enough"""
+        if self.is_original(speed):
+            rendition = load_wav(source_path)
+        else:
+            rendition = self.get(source_path, speed)
+        if rendition is not None:
+            audio, samplerate = rendition
+            sd.play(audio, samplerate=samplerate)
+            sd.wait()
+            return
+
+        # Not rendered (yet): stretch on the fly and make sure renders are queued
+        self.schedule(source_path)
+        play_audio_with_speed(source_path, speed)
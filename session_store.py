@@ -0,0 +1,260 @@
+"""
+Server-side session storage for the Flask web app.
+
+The session cookie carries only a signed random id; the session data (current
+song with its lyrics, transcripts, results) stays on the server in a TTL store:
+
+    memory  in-process dict (default; one server process)
+    sqlite  SQLite file shared by every worker process and kept across restarts
+
+Pick one with KARAOKE_SESSION_BACKEND (and KARAOKE_SESSION_DB for the SQLite
+path), then install it with app.session_interface = create_session_interface().
+
+Every stored session has a version that each write bumps. When a request saves
+a session that something else (a background job) wrote after the request
+loaded it, only the keys the request changed are merged into the stored copy,
+so neither write is lost. Reads and writes both restart the session's TTL.
+"""
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+SESSION_BACKEND_ENV = "KARAOKE_SESSION_BACKEND"
+SESSION_DB_ENV = "KARAOKE_SESSION_DB"
+DEFAULT_SESSION_DB = ".sessions.sqlite3"
+SESSION_TTL = 6 * 60 * 60  # idle seconds before a session is dropped
+PURGE_INTERVAL = 60.0  # seconds between sweeps of expired sessions
+TOUCH_INTERVAL = 60.0  # reads refresh a session's expiry at most this often (SQLite writes are not free)
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}  # sid -> (expires_at, version, serialized data)
+        self._last_purge = time.monotonic()
+
+    def load(self, sid):
+        """(data, version) of a live session, refreshing its expiry; (None, version) if absent or expired"""
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None, 0
+            expires_at, version, payload = entry
+            now = time.time()
+            if expires_at < now:
+                return None, version
+            self._sessions[sid] = (now + self.ttl, version, payload)
+            return json.loads(payload), version
+
+    def modify(self, sid, change):
+        """Atomically replace the session with change(data, version) and return the new version"""
+        with self._lock:
+            expires_at, version, payload = self._sessions.get(sid, (0, 0, None))
+            data = json.loads(payload) if payload is not None and expires_at >= time.time() else None
+            version += 1
+            # Stored serialized so request code can never mutate another request's copy
+            self._sessions[sid] = (time.time() + self.ttl, version, json.dumps(change(data, version - 1)))
+        self._maybe_purge()
+        return version
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        cutoff = time.time()
+        with self._lock:
+            for sid in [sid for sid, (expires_at, _, _) in self._sessions.items() if expires_at < cutoff]:
+                del self._sessions[sid]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    def __init__(self, path=DEFAULT_SESSION_DB, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()  # sqlite connections are per thread
+        self._last_purge = time.monotonic()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions "
+                         "(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL, "
+                         "version INTEGER NOT NULL DEFAULT 0)")
+            try:
+                # Databases created before sessions were versioned
+                conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        """(data, version) of a live session, refreshing its expiry; (None, version) if absent or expired"""
+        conn = self._connection()
+        row = conn.execute("SELECT data, version, expires_at FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None:
+            return None, 0
+        data, version, expires_at = row
+        now = time.time()
+        if expires_at < now:
+            return None, version
+        if expires_at < now + self.ttl - TOUCH_INTERVAL:
+            with conn:
+                conn.execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (now + self.ttl, sid))
+        return json.loads(data), version
+
+    def modify(self, sid, change):
+        """Atomically replace the session with change(data, version) and return the new version"""
+        conn = self._connection()
+        with conn:
+            # Take the write lock before reading so no other process can interleave
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data, version, expires_at FROM sessions WHERE sid = ?", (sid,)).fetchone()
+            version = row[1] if row else 0
+            data = json.loads(row[0]) if row and row[2] >= time.time() else None
+            conn.execute("INSERT OR REPLACE INTO sessions (sid, data, expires_at, version) VALUES (?, ?, ?, ?)",
+                         (sid, json.dumps(change(data, version)), time.time() + self.ttl, version + 1))
+        self._maybe_purge()
+        return version + 1
+
+    def delete(self, sid):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, version=0):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.version = version  # store version this copy was loaded at
+        self.loaded = copy.deepcopy(dict(initial or {}))  # to tell which keys this request changed
+
+    def merge_into(self, stored, version):
+        """The data to store: this session, or only its changes on top of a newer stored copy"""
+        data = dict(self)
+        if stored is None or version == self.version:
+            return data
+        for key in self.loaded.keys() - data.keys():
+            stored.pop(key, None)
+        stored.update({key: value for key, value in data.items()
+                       if key not in self.loaded or self.loaded[key] != value})
+        return stored
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface whose cookie holds only a signed session id"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="karaoke-session")
+
+    def session_from_cookie(self, app, cookie_value):
+        """Load the session a cookie value points at, or start a new one"""
+        if cookie_value:
+            try:
+                sid = self._signer(app).unsign(cookie_value).decode('ascii')
+            except BadSignature:
+                sid = None
+            if sid:
+                data, version = self.store.load(sid)
+                if data is not None:
+                    return ServerSideSession(data, sid=sid, version=version)
+        return ServerSideSession(sid=uuid.uuid4().hex, new=True)
+
+    def persist(self, app, session):
+        """
+        Write a modified session back to the store. Returns the cookie value to
+        send, '' to clear the cookie, or None when the cookie is unchanged.
+        """
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                return ''
+            return None
+        if not session.modified:
+            return None
+        session.version = self.store.modify(session.sid, session.merge_into)
+        return self._signer(app).sign(session.sid).decode('ascii') if session.new else None
+
+    def update(self, sid, **values):
+        """Merge values into a stored session outside a request, e.g. from a background job"""
+        def merge(stored, version):
+            stored = stored or {}
+            stored.update(values)
+            return stored
+        self.store.modify(sid, merge)
+
+    def open_session(self, app, request):
+        return self.session_from_cookie(app, request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        cookie_value = self.persist(app, session)
+        if cookie_value is None:
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if cookie_value == '':
+            response.delete_cookie(name, domain=domain, path=path)
+            return
+        response.set_cookie(
+            name,
+            cookie_value,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def create_session_interface(backend=None, ttl=SESSION_TTL):
+    """Server-side session interface for $KARAOKE_SESSION_BACKEND ('memory' or 'sqlite')"""
+    backend = backend or os.environ.get(SESSION_BACKEND_ENV, "memory")
+    if backend == "sqlite":
+        store = SQLiteSessionStore(os.environ.get(SESSION_DB_ENV, DEFAULT_SESSION_DB), ttl)
+    elif backend == "memory":
+        store = MemorySessionStore(ttl)
+    else:
+        raise ValueError(f"Unknown session backend '{backend}' (choose 'memory' or 'sqlite')")
+    return ServerSideSessionInterface(store)
@@ -0,0 +1,347 @@
+"""
+Compiled song catalog: compact metadata records plus a memory-mapped lyrics blob.
+
+songs.json stays the editable source of truth. compile_catalog() turns it into a
+single songs.catalog file laid out as:
+
+    header   magic, song count, metadata length
+    metadata JSON rows (no lyrics) with each song's lyrics offset/length
+    lyrics   UTF-8 lyrics of every song, back to back
+
+load_songs() opens the compiled file (recompiling it when songs.json is newer)
+and returns SongRecord objects whose lyrics are only read from the mapped blob
+when a song is actually played or scored. SongCatalog wraps a loaded list with
+an id index and CatalogStats counters that are updated on every add/edit/delete.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+DATABASE_PATH = "blind-karaoke/src/lib/database/songs.json"
+CATALOG_PATH = "blind-karaoke/src/lib/database/songs.catalog"
+
+CATALOG_MAGIC = b"BKCAT001"
+_HEADER = struct.Struct("<8sIQ")  # magic, song count, metadata length
+
+# Upper bounds (in words) of the lyric length histogram buckets
+LYRIC_LENGTH_BUCKETS = (25, 50, 100, 200, 400)
+
+
+class SongRecord:
+    """One catalog song; supports the dict-style access the game code already uses"""
+
+    __slots__ = ("id", "title", "artist", "spotify_track_id", "local_audio_file",
+                 "genre", "year", "difficulty", "moods", "lyrics_words", "extra",
+                 "_lyrics_offset", "_lyrics_length", "_catalog")
+
+    FIELDS = ("id", "title", "artist", "lyrics", "spotify_track_id", "local_audio_file",
+              "genre", "year", "difficulty", "moods")
+    OPTIONAL_FIELDS = ("local_audio_file", "moods")
+
+    def __init__(self, row, catalog):
+        (self.id, self.title, self.artist, self.spotify_track_id, self.local_audio_file,
+         genre, self.year, difficulty, moods, self.lyrics_words,
+         self._lyrics_offset, self._lyrics_length, self.extra) = row
+        # Genres, difficulties and moods repeat across thousands of songs
+        self.genre = sys.intern(genre)
+        self.difficulty = sys.intern(difficulty)
+        self.moods = tuple(sys.intern(mood) for mood in moods) if moods is not None else None
+        self._catalog = catalog
+
+    @property
+    def lyrics(self):
+        return self._catalog.read_lyrics(self._lyrics_offset, self._lyrics_length)
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            return list(value) if key == "moods" and value is not None else value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def keys(self):
+        keys = [key for key in self.FIELDS
+                if key not in self.OPTIONAL_FIELDS or getattr(self, key) is not None]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return f"SongRecord(id={self.id!r}, title={self.title!r}, artist={self.artist!r})"
+
+
+class CompiledCatalog:
+    """Read-only view over a compiled songs.catalog file"""
+
+    def __init__(self, catalog_path=CATALOG_PATH):
+        self.catalog_path = catalog_path
+        self._file = open(catalog_path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, count, metadata_length = _HEADER.unpack_from(self._mm, 0)
+            if magic != CATALOG_MAGIC:
+                raise ValueError(f"{catalog_path} is not a compiled song catalog")
+
+            metadata_start = _HEADER.size
+            self._lyrics_start = metadata_start + metadata_length
+            rows = json.loads(self._mm[metadata_start:self._lyrics_start])
+            if len(rows) != count:
+                raise ValueError(f"{catalog_path} is truncated ({len(rows)}/{count} songs)")
+        except Exception:
+            self.close()
+            raise
+
+        self.songs = [SongRecord(row, self) for row in rows]
+
+    def read_lyrics(self, offset, length):
+        start = self._lyrics_start + offset
+        return self._mm[start:start + length].decode('utf-8')
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+
+def count_lyric_words(lyrics):
+    """Word count used for lyric length statistics"""
+    return len(lyrics.split()) if lyrics else 0
+
+
+def lyric_length_bucket(word_count):
+    """Histogram bucket label for a lyric word count"""
+    lower = 0
+    for upper in LYRIC_LENGTH_BUCKETS:
+        if word_count < upper:
+            return f"{lower}-{upper - 1}"
+        lower = upper
+    return f"{lower}+"
+
+
+def _song_lyric_words(song):
+    words = getattr(song, "lyrics_words", None)
+    return words if words is not None else count_lyric_words(song.get('lyrics'))
+
+
+class CatalogStats:
+    """Aggregate counters kept up to date as songs are added, edited or removed"""
+
+    def __init__(self):
+        self.total_songs = 0
+        self.genres = Counter()
+        self.difficulties = Counter()
+        self.moods = Counter()
+        self.years = Counter()
+        self.lyric_lengths = Counter()
+        self._genre_list = None
+        self._year_range = None
+
+    @staticmethod
+    def _bump(counter, key, delta):
+        counter[key] += delta
+        if counter[key] <= 0:
+            # Drop zeroed keys so the counters only describe songs that exist
+            del counter[key]
+
+    def _apply(self, song, delta):
+        genre = song.get('genre', "Unknown")
+        year = song.get('year', 2024)
+        if self.genres[genre] in (0, -delta):
+            self._genre_list = None
+        if self.years[year] in (0, -delta):
+            self._year_range = None
+
+        self.total_songs += delta
+        self._bump(self.genres, genre, delta)
+        self._bump(self.difficulties, song.get('difficulty', "medium"), delta)
+        self._bump(self.years, year, delta)
+        self._bump(self.lyric_lengths, lyric_length_bucket(_song_lyric_words(song)), delta)
+        for mood in song.get('moods', []):
+            self._bump(self.moods, mood, delta)
+
+    def add(self, song):
+        self._apply(song, 1)
+
+    def remove(self, song):
+        self._apply(song, -1)
+
+    def genre_list(self):
+        """Sorted genre names, rebuilt only when a genre appears or disappears"""
+        if self._genre_list is None:
+            self._genre_list = sorted(self.genres)
+        return self._genre_list
+
+    def year_range(self):
+        if self._year_range is None:
+            self._year_range = {"min": min(self.years), "max": max(self.years)} if self.years else {"min": 0, "max": 0}
+        return self._year_range
+
+    def summary(self):
+        return {
+            "total_songs": self.total_songs,
+            "genres": dict(self.genres),
+            "difficulties": dict(self.difficulties),
+            "moods": dict(self.moods),
+            "years": {str(year): count for year, count in sorted(self.years.items())},
+            "year_range": self.year_range(),
+            "lyric_lengths": dict(self.lyric_lengths)
+        }
+
+
+class SongCatalog:
+    """Mutable song list with an id index, id counter and incrementally maintained stats"""
+
+    def __init__(self, songs):
+        # Wrap the caller's list in place so existing references stay in sync
+        self.songs = songs
+        self.stats = CatalogStats()
+        self.version = 0
+        self._by_id = {}
+        self._lock = threading.Lock()
+        for song in songs:
+            self._by_id[song['id']] = song
+            self.stats.add(song)
+        self._next_id = max(self._by_id, default=0) + 1
+
+    def get(self, song_id):
+        return self._by_id.get(song_id)
+
+    def add(self, song):
+        """Append a song, assigning the next id when it has none"""
+        with self._lock:
+            if not song.get('id'):
+                song = {"id": self._next_id, **song}
+            if song['id'] in self._by_id:
+                raise ValueError(f"Song id {song['id']} already exists")
+            self._next_id = max(self._next_id, song['id'] + 1)
+            self.songs.append(song)
+            self._by_id[song['id']] = song
+            self.stats.add(song)
+            self.version += 1
+        return song
+
+    def update(self, song_id, **changes):
+        """Edit fields of an existing song; returns the updated song or None"""
+        with self._lock:
+            song = self._by_id.get(song_id)
+            if song is None:
+                return None
+            updated = {**dict(song), **changes, "id": song_id}
+            self.songs[self.songs.index(song)] = updated
+            self._by_id[song_id] = updated
+            self.stats.remove(song)
+            self.stats.add(updated)
+            self.version += 1
+        return updated
+
+    def remove(self, song_id):
+        """Delete a song; returns the removed song or None"""
+        with self._lock:
+            song = self._by_id.pop(song_id, None)
+            if song is None:
+                return None
+            self.songs.remove(song)
+            self.stats.remove(song)
+            self.version += 1
+        return song
+
+
+def compile_catalog(json_path=DATABASE_PATH, catalog_path=CATALOG_PATH):
+    """Compile songs.json into the binary catalog format; returns the song count"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        songs = json.load(f)['songs']
+
+    known_fields = set(SongRecord.FIELDS)
+    rows = []
+    lyrics_chunks = []
+    offset = 0
+
+    for song in songs:
+        lyrics = (song.get('lyrics') or "").encode('utf-8')
+        extra = {key: value for key, value in song.items() if key not in known_fields} or None
+        rows.append([
+            song['id'],
+            song['title'],
+            song['artist'],
+            song.get('spotify_track_id'),
+            song.get('local_audio_file'),
+            song.get('genre', "Unknown"),
+            song.get('year', 2024),
+            song.get('difficulty', "medium"),
+            song.get('moods'),
+            count_lyric_words(song.get('lyrics')),
+            offset,
+            len(lyrics),
+            extra
+        ])
+        lyrics_chunks.append(lyrics)
+        offset += len(lyrics)
+
+    metadata = json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    # A unique temp file per writer, so concurrent compiles never replace with a half-written file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(catalog_path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(CATALOG_MAGIC, len(rows), len(metadata)))
+            f.write(metadata)
+            for chunk in lyrics_chunks:
+                f.write(chunk)
+        os.replace(temp_path, catalog_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(rows)
+
+
+def _catalog_is_fresh(json_path, catalog_path):
+    try:
+        return os.path.getmtime(catalog_path) >= os.path.getmtime(json_path)
+    except OSError:
+        return False
+
+
+def load_songs(json_path=DATABASE_PATH, catalog_path=CATALOG_PATH, compile_if_stale=True):
+    """Load the song list, preferring the compiled catalog over parsing songs.json"""
+    if not _catalog_is_fresh(json_path, catalog_path) and compile_if_stale:
+        try:
+            compile_catalog(json_path, catalog_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not compile song catalog: {e}")
+
+    if _catalog_is_fresh(json_path, catalog_path):
+        try:
+            return CompiledCatalog(catalog_path).songs
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not open compiled catalog, falling back to JSON: {e}")
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['songs']
+
+
+if __name__ == "__main__":
+    count = compile_catalog()
+    size_kb = os.path.getsize(CATALOG_PATH) / 1024
+    print(f"✅ Compiled {count} songs into {CATALOG_PATH} ({size_kb:.1f} KB)")
@@ -0,0 +1,111 @@
+"""
+Pre-resolve Spotify metadata for the whole song catalog.
+
+Run `python spotify_index.py` after adding songs. Every spotify_track_id in
+songs.json is looked up with the multi-track endpoint (50 ids per call) and the
+result is written to a sidecar spotify_index.json next to the catalog:
+
+    {"generated_at": ..., "tracks": {track_id: {name, artists, preview_url,
+                                                duration_ms, fallback, indexed_at}}}
+
+fallback is the alternative track with a preview for songs whose own track has
+none (None when no alternative exists), so play time needs no lookups at all.
+When the search for an alternative fails, fallback is left out so play time
+(and the next build) searches again instead of trusting a transient error.
+
+Entries expire like the metadata cache's: one older than its TTL is ignored,
+and play time goes back to the (cached) API until the index is rebuilt.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from metadata_cache import DEFAULT_TTL
+
+SPOTIFY_INDEX_PATH = "blind-karaoke/src/lib/database/spotify_index.json"
+
+
+def is_fresh(entry, ttl=DEFAULT_TTL):
+    """True while an index entry is younger than ttl seconds"""
+    return time.time() - entry.get('indexed_at', 0) < ttl
+
+
+def load_spotify_index(path=SPOTIFY_INDEX_PATH, ttl=DEFAULT_TTL):
+    """Return the fresh {track_id: entry} from the sidecar index, or {} if it has not been built"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read Spotify index: {e}")
+        return {}
+
+    tracks = data.get('tracks', {})
+    for entry in tracks.values():
+        # Indexes written before entries carried their own timestamp
+        entry.setdefault('indexed_at', data.get('generated_at', 0))
+    fresh = {track_id: entry for track_id, entry in tracks.items() if is_fresh(entry, ttl)}
+    if len(fresh) < len(tracks):
+        print(f"⚠️ {len(tracks) - len(fresh)} Spotify index entries are stale; "
+              f"run 'python spotify_index.py' to refresh them")
+    return fresh
+
+
+def build_spotify_index(controller, songs, path=SPOTIFY_INDEX_PATH):
+    """Resolve every catalog track in batches and write the sidecar index"""
+    if not controller.sp:
+        print("Spotify not connected!")
+        return None
+
+    songs = [song for song in songs if song.get('spotify_track_id')]
+    track_ids = list(dict.fromkeys(song['spotify_track_id'] for song in songs))
+    print(f"Resolving {len(track_ids)} Spotify tracks...")
+
+    index = {}
+    indexed_at = int(time.time())
+    for track_id, track in zip(track_ids, controller.get_tracks(track_ids)):
+        if track:
+            index[track_id] = dict(track, indexed_at=indexed_at)
+        else:
+            print(f"⚠️ Track {track_id} not found on Spotify")
+
+    # Songs without a preview get their alternative looked up now instead of at play time
+    for song in songs:
+        entry = index.get(song['spotify_track_id'])
+        if entry is None or entry.get('preview_url') or 'fallback' in entry:
+            continue
+        try:
+            entry['fallback'] = controller.find_track_with_preview(song['title'], song['artist'],
+                                                                   raise_errors=True)
+        except Exception as e:
+            print(f"⚠️ Could not search for an alternative to '{song['title']}': {e}")
+
+    missing_previews = sum(1 for entry in index.values()
+                           if not entry.get('preview_url') and not entry.get('fallback'))
+
+    # Unique temp file, so a concurrent build never writes into this one's
+    temp_path = None
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"generated_at": indexed_at, "tracks": index}, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not write Spotify index: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+
+    print(f"✅ Indexed {len(index)} tracks ({missing_previews} with no playable preview)")
+    controller.spotify_index = index
+    return index
+
+
+if __name__ == "__main__":
+    from song_catalog import load_songs
+    from spotify_stuff import SpotifyController
+
+    build_spotify_index(SpotifyController(), load_songs())
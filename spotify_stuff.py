@@ -3,24 +3,53 @@ from spotipy.oauth2 import SpotifyOAuth
 import time
 import keyboard
 import threading
+import contextvars
 import os
 import webbrowser
 import pygame
-import requests
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from disk_cache import DiskLRUCache
+from metadata_cache import MetadataCache, MISS
+from http_client import get_shared_session, DEFAULT_TIMEOUT
+from spotify_index import load_spotify_index, is_fresh
+from pcm_cache import PcmCache
+from playback_backends import prepare_local_file
+from metrics import spotify_call, PREVIEW_DOWNLOAD_SECONDS, PLAYBACK_START_SECONDS
+from tracing import span, traced
+
+PREVIEW_CACHE_DIR = ".preview_cache"
+PREVIEW_CACHE_MAX_BYTES = 200 * 1024 * 1024  # ~500 thirty-second previews
+TRACKS_BATCH_SIZE = 50  # Spotify's limit for the multi-track endpoint
+SEARCH_WORKERS = 4  # one per find_track_with_preview query variant
+DEVICE_CACHE_TTL = 30.0  # seconds before the chosen Spotify device is re-resolved
 
 class SpotifyController:
-    def __init__(self):
+    def __init__(self, open_browser=True, show_dialog=True):
         # Spotify Developer credentials
         self.client_id = "dbff5b5d3efe40c598aff8029738bc38"
         self.client_secret = "da33d9e0c27e4f6caf3dd6dc0adfe9a1"
         self.redirect_uri = "http://127.0.0.1:8888/callback"
 
         self.scope = "user-modify-playback-state user-read-playback-state"
+        self.open_browser = open_browser  # False on headless boxes: reuse the cached token only
+        self.show_dialog = show_dialog
         self.sp = None
+        # Pooled keep-alive session shared by spotipy and preview downloads
+        self.http = get_shared_session()
         self.current_track_id = None
         self.is_playing = False
         self.use_integrated_player = True  # Use integrated player instead of Spotify app
+        self._cached_device = None  # (device, resolved_at) for Spotify-app transport controls
+
+        # Downloaded previews, reused across plays and restarts
+        self.preview_cache = DiskLRUCache(PREVIEW_CACHE_DIR, PREVIEW_CACHE_MAX_BYTES, suffix=".mp3")
+        # Track lookups and preview searches, reused across plays and restarts
+        self.metadata_cache = MetadataCache()
+        # Catalog tracks resolved ahead of time by spotify_index.py (may be empty)
+        self.spotify_index = load_spotify_index()
+        self.search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="spotify-search")
 
         # Initialize pygame mixer for audio playback
         try:
@@ -30,6 +59,9 @@ class SpotifyController:
             print(f"Warning: Could not initialize audio player: {e}")
             self.use_integrated_player = False
 
+        # Local tracks pre-decoded to WAV at the mixer's format for instant starts
+        self.pcm_cache = PcmCache()
+
         self.setup_spotify()
 
     def setup_spotify(self):
@@ -41,14 +73,22 @@ class SpotifyController:
                 redirect_uri=self.redirect_uri,
                 scope=self.scope,
                 cache_path=".spotify_cache",
-                open_browser=True,  # Force browser to open
-                show_dialog=True    # Force login dialog even if logged in
+                open_browser=self.open_browser,  # Force browser to open
+                show_dialog=self.show_dialog,    # Force login dialog even if logged in
+                requests_session=self.http,
+                requests_timeout=DEFAULT_TIMEOUT
             )
 
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
+            # Passing our session makes spotipy use its pool, timeouts and retries
+            self.sp = spotipy.Spotify(
+                auth_manager=auth_manager,
+                requests_session=self.http,
+                requests_timeout=DEFAULT_TIMEOUT
+            )
 
             # Get current user info safely
-            user = self.sp.current_user()
+            with spotify_call('current_user'):
+                user = self.sp.current_user()
             display_name = user.get("display_name", "Unknown User")
             product = user.get("product", "unknown")
 
@@ -79,13 +119,29 @@ class SpotifyController:
             return []
 
         try:
-            devices = self.sp.devices()
+            with spotify_call('devices'):
+                devices = self.sp.devices()
             return devices['devices']
         except Exception as e:
             print(f"Error getting devices: {e}")
             return []
 
-    def select_device(self, device_id=None):
+    def select_device(self, device_id=None, use_cache=True):
+        """Pick the playback device, reusing the last choice for DEVICE_CACHE_TTL seconds"""
+        if use_cache and self._cached_device:
+            device, resolved_at = self._cached_device
+            if time.time() - resolved_at < DEVICE_CACHE_TTL and (not device_id or device['id'] == device_id):
+                return device
+
+        device = self._resolve_device(device_id)
+        self._cached_device = (device, time.time()) if device else None
+        return device
+
+    def invalidate_device(self):
+        """Forget the cached device so the next control call asks Spotify again"""
+        self._cached_device = None
+
+    def _resolve_device(self, device_id=None):
         devices = self.get_active_devices()
         if not devices:
             print("No active Spotify devices found. Please open Spotify on a device.")
@@ -102,55 +158,191 @@ class SpotifyController:
             else:
                 return devices[0]
 
-    def play_track_integrated(self, track_id, song_title=None, artist=None):
-        """Play track using integrated player (30-second preview)"""
+    def _run_on_device(self, action, device_id=None):
+        """
+        Run action(device) on the cached device. A Spotify error usually means
+        the device went away, so the cache is dropped and the call retried once
+        on a freshly resolved device. Returns the device used, or None.
+        """
+        device = self.select_device(device_id)
+        if not device:
+            return None
+        try:
+            with spotify_call('playback_control'):
+                action(device)
+            return device
+        except spotipy.SpotifyException:
+            self.invalidate_device()
+            device = self.select_device(device_id, use_cache=False)
+            if not device:
+                return None
+            with spotify_call('playback_control'):
+                action(device)
+            return device
+
+    @staticmethod
+    def _trim_track(track):
+        """Keep only the track fields the player uses, so cache entries stay small"""
+        if not track:
+            return None
+        return {
+            'id': track['id'],
+            'name': track['name'],
+            'artists': [{'name': a['name']} for a in track['artists']],
+            'preview_url': track.get('preview_url'),
+            'duration_ms': track.get('duration_ms')
+        }
+
+    def indexed_track(self, track_id):
+        """The pre-resolved index entry for track_id, unless it is missing or older than the metadata TTL"""
+        indexed = self.spotify_index.get(track_id)
+        if indexed is None or not is_fresh(indexed, self.metadata_cache.ttl):
+            return None
+        return indexed
+
+    def get_track(self, track_id):
+        """Track metadata (name, artists, preview_url, duration_ms), served from cache when possible"""
+        indexed = self.indexed_track(track_id)
+        if indexed:
+            return indexed
+
+        key = f"track:{track_id}"
+        track = self.metadata_cache.lookup(key)
+        if track is not MISS:
+            return track
+
+        with spotify_call('track'):
+            track = self._trim_track(self.sp.track(track_id))
+        self.metadata_cache.store(key, track)
+        return track
+
+    def get_tracks(self, track_ids):
+        """Batch version of get_track: one API call per 50 uncached ids"""
+        tracks = {}
+        missing = []
+        for track_id in dict.fromkeys(track_ids):
+            track = self.metadata_cache.lookup(f"track:{track_id}")
+            if track is MISS:
+                missing.append(track_id)
+            else:
+                tracks[track_id] = track
+
+        for start in range(0, len(missing), TRACKS_BATCH_SIZE):
+            batch = missing[start:start + TRACKS_BATCH_SIZE]
+            with spotify_call('tracks'):
+                results = self.sp.tracks(batch)['tracks']
+            for track_id, track in zip(batch, results):
+                track = self._trim_track(track)
+                self.metadata_cache.store(f"track:{track_id}", track)
+                tracks[track_id] = track
+
+        return [tracks[track_id] for track_id in track_ids]
+
+    def get_preview_file(self, preview_url):
+        """Return a local file for a preview URL, downloading it only on a cache miss"""
+        # Preview URLs embed the audio's content hash in the path; the query
+        # string only carries the client id, so it is left out of the key
+        parts = urlsplit(preview_url)
+        key = self.preview_cache.key_for(f"{parts.netloc}{parts.path}")
+
+        def download(temp_path):
+            with PREVIEW_DOWNLOAD_SECONDS.time(), span("spotify.preview_download"), \
+                    self.http.get(preview_url, stream=True) as response:
+                if response.status_code != 200:
+                    print("Failed to download preview")
+                    return False
+                with open(temp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+            return True
+
+        return self.preview_cache.get_or_create(key, download)
+
+    @traced("spotify.prepare_track")
+    def prepare_track(self, track_id, song_title=None, artist=None):
+        """
+        Resolve and download a track's preview into memory without playing it.
+        Returns a prepared audio dict for play_prepared(), or None.
+        """
         if not self.sp:
             print("Spotify not connected!")
-            return False
+            return None
 
         try:
-            track_info = self.sp.track(track_id)
+            track_info = self.get_track(track_id)
             preview_url = track_info.get('preview_url')
+            label = f"{track_info['name']} by {track_info['artists'][0]['name']}"
 
             # If no preview, try to find alternative with preview
             if not preview_url and song_title and artist:
-                print("No preview for original track, searching for alternative...")
-                alternative = self.find_track_with_preview(song_title, artist)
+                indexed = self.indexed_track(track_id)
+                if indexed is not None and 'fallback' in indexed:
+                    # Resolved ahead of time; None means no alternative exists
+                    alternative = indexed['fallback']
+                else:
+                    print("No preview for original track, searching for alternative...")
+                    alternative = self.find_track_with_preview(song_title, artist)
                 if alternative:
                     preview_url = alternative['preview_url']
-                    print(f"Found alternative: {alternative['name']} by {alternative['artist']}")
+                    label = f"{alternative['name']} by {alternative['artist']}"
+                    print(f"Found alternative: {label}")
                 else:
                     print("⚠️ No preview available for this track or alternatives")
-                    return False
+                    return None
             elif not preview_url:
                 print("⚠️ No preview available for this track")
-                return False
+                return None
+
+            preview_file = self.get_preview_file(preview_url)
+            if not preview_file:
+                return None
+
+            with open(preview_file, 'rb') as f:
+                data = f.read()
+            return {'source': 'spotify_preview', 'track_id': track_id, 'label': label, 'data': data}
+
+        except Exception as e:
+            print(f"Error preparing integrated track: {e}")
+            return None
+
+    @traced("spotify.prepare_local_file")
+    def prepare_local_file(self, file_path, wait_for_decode=False):
+        """Get a local audio file ready to play by path: its pre-decoded WAV, or the file itself"""
+        return prepare_local_file(self.pcm_cache, file_path, wait_for_decode)
 
-            # Download and play preview
+    @traced("spotify.play_prepared")
+    def play_prepared(self, prepared):
+        """Start playback from a buffer returned by prepare_track()/prepare_local_file()"""
+        try:
             try:
-                if 'track_info' in locals():
-                    print(f"Playing preview: {track_info['name']} by {track_info['artists'][0]['name']}")
+                if prepared['source'] == 'local':
+                    print(f"Playing local file: {prepared['label']}")
                 else:
-                    print("Playing preview (alternative track)")
+                    print(f"Playing preview: {prepared['label']}")
             except UnicodeEncodeError:
-                print("Playing preview (encoding issue with name)")
-
-            response = requests.get(preview_url)
-            if response.status_code != 200:
-                print("Failed to download preview")
-                return False
+                print("Playing audio (encoding issue with name)")
 
-            audio_data = BytesIO(response.content)
-            pygame.mixer.music.load(audio_data)
-            pygame.mixer.music.play()
+            with PLAYBACK_START_SECONDS.labels(prepared['source']).time():
+                if prepared['data'] is not None:
+                    pygame.mixer.music.load(BytesIO(prepared['data']))
+                else:
+                    pygame.mixer.music.load(prepared['file'])
+                pygame.mixer.music.play()
 
-            self.current_track_id = track_id
+            self.current_track_id = prepared['track_id']
             self.is_playing = True
             return True
 
         except Exception as e:
-            print(f"Error playing integrated track: {e}")
+            print(f"Error playing prepared audio: {e}")
+            return False
+
+    def play_track_integrated(self, track_id, song_title=None, artist=None):
+        """Play track using integrated player (30-second preview)"""
+        prepared = self.prepare_track(track_id, song_title, artist)
+        if not prepared:
             return False
+        return self.play_prepared(prepared)
 
     def play_local_file(self, file_path):
         """Play local audio file"""
@@ -159,8 +351,14 @@ class SpotifyController:
                 print(f"Audio file not found: {file_path}")
                 return False
 
-            pygame.mixer.music.load(file_path)
-            pygame.mixer.music.play()
+            # Start from the pre-decoded copy when there is one; otherwise
+            # decode on the fly this time and queue the file for next time
+            decoded = self.pcm_cache.get(file_path)
+            if not decoded:
+                self.pcm_cache.schedule(file_path)
+            with PLAYBACK_START_SECONDS.labels('local').time():
+                pygame.mixer.music.load(decoded or file_path)
+                pygame.mixer.music.play()
 
             print(f"Playing local file: {os.path.basename(file_path)}")
             self.is_playing = True
@@ -180,17 +378,19 @@ class SpotifyController:
                 print("Spotify not connected!")
                 return False
             try:
-                device = self.select_device(device_id)
+                track_uri = f"spotify:track:{track_id}"
+                with PLAYBACK_START_SECONDS.labels('spotify_app').time():
+                    device = self._run_on_device(
+                        lambda d: self.sp.start_playback(device_id=d['id'], uris=[track_uri]),
+                        device_id
+                    )
                 if not device:
                     return False
 
-                track_uri = f"spotify:track:{track_id}"
-                self.sp.start_playback(device_id=device['id'], uris=[track_uri])
-
                 self.current_track_id = track_id
                 self.is_playing = True
 
-                track_info = self.sp.track(track_id)
+                track_info = self.get_track(track_id)
                 try:
                     print(f"▶️ Playing: {track_info['name']} by {track_info['artists'][0]['name']}")
                     print(f"On device: {device['name']}")
@@ -220,11 +420,9 @@ class SpotifyController:
                 print("Spotify not connected!")
                 return False
             try:
-                device = self.select_device(device_id)
-                if not device:
+                if not self._run_on_device(lambda d: self.sp.pause_playback(device_id=d['id']), device_id):
                     return False
 
-                self.sp.pause_playback(device_id=device['id'])
                 self.is_playing = False
                 print("⏸️ Paused playback")
                 return True
@@ -250,11 +448,9 @@ class SpotifyController:
                 print("Spotify not connected!")
                 return False
             try:
-                device = self.select_device(device_id)
-                if not device:
+                if not self._run_on_device(lambda d: self.sp.start_playback(device_id=d['id']), device_id):
                     return False
 
-                self.sp.start_playback(device_id=device['id'])
                 self.is_playing = True
                 print("▶️ Resumed playback")
                 return True
@@ -296,11 +492,9 @@ class SpotifyController:
                 print("Spotify not connected!")
                 return False
             try:
-                device = self.select_device(device_id)
-                if not device:
+                if not self._run_on_device(lambda d: self.sp.volume(volume, device_id=d['id']), device_id):
                     return False
 
-                self.sp.volume(volume, device_id=device['id'])
                 print(f"🔊 Volume set to {volume}%")
                 return True
 
@@ -314,7 +508,8 @@ class SpotifyController:
             return []
 
         try:
-            results = self.sp.search(q=query, type='track', limit=limit)
+            with spotify_call('search'):
+                results = self.sp.search(q=query, type='track', limit=limit)
             tracks = results['tracks']['items']
 
             search_results = []
@@ -337,12 +532,23 @@ class SpotifyController:
             print(f"Error searching tracks: {e}")
             return []
 
-    def find_track_with_preview(self, song_title, artist):
-        """Search for a track and find one with a preview available"""
+    @traced("spotify.find_track_with_preview")
+    def find_track_with_preview(self, song_title, artist, raise_errors=False):
+        """
+        Search for a track and find one with a preview available. Returns None
+        when nothing has a preview; with raise_errors=True a failed search
+        (network error, rate limit) raises instead of also returning None.
+        """
         if not self.sp:
             return None
 
-        # Try different search queries
+        # Cached result, including "nothing has a preview" negative entries
+        cache_key = f"preview_search:{song_title.lower()}|{artist.lower()}"
+        cached = self.metadata_cache.lookup(cache_key)
+        if cached is not MISS:
+            return cached
+
+        # Query variants, highest priority first
         queries = [
             f"track:{song_title} artist:{artist}",
             f"{song_title} {artist}",
@@ -350,24 +556,48 @@ class SpotifyController:
             f"artist:{artist}"
         ]
 
-        for query in queries:
-            try:
-                results = self.sp.search(q=query, type='track', limit=20)
-                tracks = results['tracks']['items']
-
-                # Look for tracks with previews
-                for track in tracks:
-                    if track['preview_url']:
-                        return {
-                            'id': track['id'],
-                            'name': track['name'],
-                            'artist': track['artists'][0]['name'],
-                            'preview_url': track['preview_url']
-                        }
-            except Exception as e:
-                print(f"Search error: {e}")
-                continue
+        # Issue every variant at once, then take results in priority order so a
+        # lower-priority hit never wins over a higher-priority one still in flight
+        # Each search runs in a copy of this context so its spans nest under this one
+        futures = [self.search_pool.submit(contextvars.copy_context().run, self._search_preview, query)
+                   for query in queries]
+        search_error = None
+        try:
+            for future in futures:
+                try:
+                    alternative = future.result()
+                except Exception as e:
+                    print(f"Search error: {e}")
+                    search_error = e
+                    continue
+
+                if alternative:
+                    self.metadata_cache.store(cache_key, alternative)
+                    return alternative
+        finally:
+            # Drop lower-priority searches that have not started yet
+            for future in futures:
+                future.cancel()
+
+        # Only remember "no preview" when every search actually answered
+        if search_error is None:
+            self.metadata_cache.store(cache_key, None)
+        elif raise_errors:
+            raise search_error
+        return None
 
+    def _search_preview(self, query):
+        """Run one search and return the first track with a preview, or None"""
+        with spotify_call('search'):
+            results = self.sp.search(q=query, type='track', limit=20)
+        for track in results['tracks']['items']:
+            if track['preview_url']:
+                return {
+                    'id': track['id'],
+                    'name': track['name'],
+                    'artist': track['artists'][0]['name'],
+                    'preview_url': track['preview_url']
+                }
         return None
 
     def get_current_playback(self):
@@ -0,0 +1,165 @@
+"""
+Streaming, pitch-preserving time-stretch (phase vocoder) for practice playback.
+
+StreamingTimeStretcher consumes audio in blocks and emits stretched audio in
+blocks, holding only about one FFT frame of state, so a whole song is never
+loaded or copied at once. Tempo changes without changing pitch, and `speed` can
+be changed between blocks while audio is playing.
+"""
+
+import threading
+import wave
+
+import numpy as np
+import sounddevice as sd
+
+FRAME_SIZE = 2048  # FFT size in samples (~46 ms at 44.1 kHz)
+SYNTHESIS_HOP = FRAME_SIZE // 4
+READ_BLOCK = 4096  # frames read from the WAV per iteration
+MIN_SPEED = 0.25
+MAX_SPEED = 4.0
+
+
+def _wrap_phase(phase):
+    return (phase + np.pi) % (2 * np.pi) - np.pi
+
+
+class StreamingTimeStretcher:
+    def __init__(self, channels=1, speed=1.0, frame_size=FRAME_SIZE, hop=SYNTHESIS_HOP):
+        self.channels = channels
+        self.frame_size = frame_size
+        self.hop = hop
+        self.speed = speed
+
+        self._window = np.hanning(frame_size + 1)[:-1][:, None]
+        # Overlap-added squared Hann windows sum to this constant at this hop
+        self._gain = float(np.sum(self._window ** 2)) / hop
+        self._bin_freqs = (2 * np.pi * np.arange(frame_size // 2 + 1) / frame_size)[:, None]
+
+        self._input = np.zeros((0, channels))
+        self._read_pos = 0.0     # fractional analysis position within _input
+        self._prev_start = None  # start index of the previous analysis frame
+        self._prev_phase = None
+        self._synth_phase = None
+        self._overlap = np.zeros((frame_size, channels))
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @speed.setter
+    def speed(self, value):
+        # Read once per frame, so changes apply smoothly mid-stream
+        self._speed = min(MAX_SPEED, max(MIN_SPEED, float(value)))
+
+    def _next_frame(self):
+        start = int(self._read_pos)
+        frame = self._input[start:start + self.frame_size] * self._window
+        spectrum = np.fft.rfft(frame, axis=0)
+        magnitude = np.abs(spectrum)
+        phase = np.angle(spectrum)
+
+        if self._prev_phase is None:
+            synth_phase = phase
+        else:
+            analysis_hop = start - self._prev_start
+            if analysis_hop > 0:
+                # Each bin's true frequency from its phase advance over the analysis hop
+                deviation = _wrap_phase(phase - self._prev_phase - self._bin_freqs * analysis_hop)
+                true_freqs = self._bin_freqs + deviation / analysis_hop
+            else:
+                true_freqs = self._bin_freqs
+            synth_phase = self._synth_phase + true_freqs * self.hop
+
+        self._prev_start = start
+        self._prev_phase = phase
+        self._synth_phase = synth_phase
+
+        frame_out = np.fft.irfft(magnitude * np.exp(1j * synth_phase), n=self.frame_size, axis=0)
+        self._overlap += frame_out * self._window
+
+        out = self._overlap[:self.hop] / self._gain
+        self._overlap = np.concatenate([self._overlap[self.hop:], np.zeros((self.hop, self.channels))])
+        self._read_pos += self.hop * self._speed
+        return out
+
+    def process(self, block):
+        """Feed a (frames, channels) float block; returns whatever stretched audio is ready"""
+        block = np.asarray(block, dtype=np.float64).reshape(-1, self.channels)
+        self._input = np.concatenate([self._input, block])
+
+        output = []
+        while int(self._read_pos) + self.frame_size <= len(self._input):
+            output.append(self._next_frame())
+
+        # Drop input no future frame can reach so memory stays at about one frame
+        consumed = int(self._read_pos)
+        if consumed:
+            self._input = self._input[consumed:]
+            self._read_pos -= consumed
+            if self._prev_start is not None:
+                self._prev_start -= consumed
+
+        if not output:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        return np.concatenate(output).astype(np.float32)
+
+    def flush(self):
+        """Process the remaining input and return the final tail"""
+        tail = self.process(np.zeros((self.frame_size, self.channels)))
+        remainder = (self._overlap[:self.frame_size - self.hop] / self._gain).astype(np.float32)
+        self._overlap[:] = 0
+        return np.concatenate([tail, remainder])
+
+
+class TimeStretchPlayer:
+    """Plays a WAV through a stretcher; set .speed from another thread to change tempo live"""
+
+    def __init__(self, filename, speed=1.0, block_frames=READ_BLOCK):
+        self.filename = filename
+        self.block_frames = block_frames
+        self._speed = speed
+        self._stretcher = None
+        self._stop = threading.Event()
+
+    @property
+    def speed(self):
+        return self._stretcher.speed if self._stretcher else self._speed
+
+    @speed.setter
+    def speed(self, value):
+        self._speed = value
+        if self._stretcher:
+            self._stretcher.speed = value
+
+    def stop(self):
+        self._stop.set()
+
+    def play(self):
+        with wave.open(self.filename, 'rb') as wf:
+            n_channels = wf.getnchannels()
+            framerate = wf.getframerate()
+            self._stretcher = StreamingTimeStretcher(n_channels, self._speed)
+
+            with sd.OutputStream(samplerate=framerate, channels=n_channels, dtype='float32') as stream:
+                while not self._stop.is_set():
+                    frames = wf.readframes(self.block_frames)
+                    if not frames:
+                        break
+                    block = np.frombuffer(frames, dtype=np.int16).reshape(-1, n_channels)
+                    out = self._stretcher.process(block.astype(np.float32) / 32768.0)
+                    if len(out):
+                        # write() blocks while the device buffer is full, bounding memory
+                        stream.write(np.clip(out, -1.0, 1.0))
+
+                if not self._stop.is_set():
+                    stream.write(np.clip(self._stretcher.flush(), -1.0, 1.0))
+
+
+def play_audio_with_speed(filename, speed=1.0):
+    """
+    Play WAV file at a given speed, keeping the original pitch.
+    speed > 1.0 => faster
+    speed < 1.0 => slower
+    """
+    TimeStretchPlayer(filename, speed).play()
@@ -0,0 +1,211 @@
+"""
+Lightweight hierarchical tracing spans.
+
+    with span("transcriber.stop_recording", model_size="base") as s:
+        with span("write_wav"):
+            ...
+        s.set(audio_seconds=12.5)
+
+Spans opened inside another span (in the same thread or asyncio task) become
+its children; the current span is tracked with contextvars. Requests and jobs
+open their outermost span with root=True; spans that end up with no parent
+(background prefetches, live partial transcripts) are kept apart from those so
+they cannot push request traces out of memory. When a span ends it is handed
+to every configured sink:
+
+    ring   keeps the most recent traces in memory (default; see recent_traces())
+    log    prints each finished trace as an indented timing tree
+    jsonl  appends one JSON object per span to KARAOKE_TRACE_FILE
+
+Sinks are picked with KARAOKE_TRACE_SINKS, e.g. "ring,jsonl". With no sinks,
+span() only records two timestamps.
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+TRACE_SINKS_ENV = "KARAOKE_TRACE_SINKS"
+TRACE_FILE_ENV = "KARAOKE_TRACE_FILE"
+DEFAULT_TRACE_FILE = "traces.jsonl"
+RING_SIZE = 200  # finished request/job traces kept by the ring sink
+BACKGROUND_RING_SIZE = 50  # finished parentless spans that are not request/job roots
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'trace_id', 'parent', 'attributes', 'children',
+                 'start', 'wall_start', 'duration', 'error', 'root')
+
+    def __init__(self, name, parent=None, attributes=None, root=False):
+        self.name = name
+        self.root = root
+        self.span_id = next(_ids)
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Attach attributes, e.g. audio_seconds or word counts known only mid-span"""
+        self.attributes.update(attributes)
+
+    def to_dict(self, nested=False):
+        data = {
+            'name': self.name,
+            'span_id': self.span_id,
+            'trace_id': self.trace_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'start': self.wall_start,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'attributes': self.attributes
+        }
+        if self.error:
+            data['error'] = self.error
+        if nested:
+            data['children'] = [child.to_dict(nested=True) for child in self.children]
+        return data
+
+
+# -- sinks ------------------------------------------------------------------------
+
+class RingSink:
+    """Keeps the last finished request/job traces, and separately the last background spans"""
+
+    def __init__(self, size=RING_SIZE, background_size=BACKGROUND_RING_SIZE):
+        self.traces = deque(maxlen=size)
+        self.background = deque(maxlen=background_size)
+
+    def on_end(self, span):
+        if span.parent is None:
+            (self.traces if span.root else self.background).append(span)
+
+
+class LogSink:
+    """Prints each finished trace as an indented tree of timings"""
+
+    def on_end(self, span):
+        if span.parent is None:
+            print("\n".join(self._lines(span, 0)))
+
+    def _lines(self, span, depth):
+        attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+        error = f" ERROR {span.error}" if span.error else ""
+        lines = [f"[trace] {'  ' * depth}{span.name} {span.duration * 1000:.1f} ms {attributes}{error}".rstrip()]
+        for child in span.children:
+            lines.extend(self._lines(child, depth + 1))
+        return lines
+
+
+class JsonlSink:
+    """Appends every finished span as one JSON line"""
+
+    def __init__(self, path=DEFAULT_TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def on_end(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+_sinks = []
+_ring = None
+
+
+def add_sink(sink):
+    _sinks.append(sink)
+    return sink
+
+
+def configure(sink_names):
+    """Replace the sinks with the named ones ('ring', 'log', 'jsonl')"""
+    global _ring
+    _sinks.clear()
+    _ring = None
+    for name in sink_names:
+        name = name.strip()
+        if name == "ring":
+            _ring = add_sink(RingSink())
+        elif name == "log":
+            add_sink(LogSink())
+        elif name == "jsonl":
+            add_sink(JsonlSink(os.environ.get(TRACE_FILE_ENV, DEFAULT_TRACE_FILE)))
+        elif name:
+            raise ValueError(f"Unknown trace sink '{name}' (choose from ring, log, jsonl)")
+
+
+def recent_traces(limit=20, background=False):
+    """
+    The most recent finished request/job traces from the ring sink (or, with
+    background=True, parentless background spans), newest first, as nested dicts
+    """
+    if _ring is None:
+        return []
+    traces = _ring.background if background else _ring.traces
+    return [trace.to_dict(nested=True) for trace in list(traces)[::-1][:limit]]
+
+
+def clear_traces():
+    """Drop the ring sink's traces (shed under memory pressure)"""
+    if _ring is not None:
+        _ring.traces.clear()
+        _ring.background.clear()
+
+
+# -- API ----------------------------------------------------------------------------
+
+@contextmanager
+def span(name, root=False, **attributes):
+    """Time a block as a child of the current span; root=True marks a request or job's outermost span"""
+    parent = _current_span.get()
+    current = Span(name, parent, attributes, root and parent is None)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+        if parent is not None:
+            parent.children.append(current)
+        for sink in _sinks:
+            try:
+                sink.on_end(current)
+            except Exception as e:
+                print(f"Warning: trace sink failed: {e}")
+
+
+def traced(name=None, root=False):
+    """Decorator that runs the function inside span(name or the function's qualified name)"""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, root=root):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_span():
+    return _current_span.get()
+
+
+configure(os.environ.get(TRACE_SINKS_ENV, "ring").split(","))
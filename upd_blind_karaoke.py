@@ -1,10 +1,8 @@
 import whisper
 import sounddevice as sd
-import numpy as np
 import wave
 import os
-from scipy.signal import resample_poly
-from math import gcd
+from time_stretch import play_audio_with_speed  # streaming, pitch-preserving
 
 # -----------------------------
 # Parameters
@@ -13,43 +11,6 @@ DURATION = 10  # seconds
 SAMPLE_RATE = 16000  # 16kHz, works best with Whisper
 FILENAME = "temp_audio.wav"
 
-# -----------------------------
-# Function: Play WAV at custom speed
-# -----------------------------
-def play_audio_with_speed(filename, speed=1.0):
-    """
-    Play WAV file at a given speed without excessive scratchiness.
-    speed > 1.0 => faster
-    speed < 1.0 => slower
-    """
-    # Load WAV
-    with wave.open(filename, 'rb') as wf:
-        n_channels = wf.getnchannels()
-        framerate = wf.getframerate()
-        n_frames = wf.getnframes()
-        audio = wf.readframes(n_frames)
-        audio_np = np.frombuffer(audio, dtype=np.int16)
-        if n_channels > 1:
-            audio_np = audio_np.reshape(-1, n_channels)
-
-    # Convert to float32 in [-1, 1]
-    audio_float = audio_np.astype(np.float32) / 32768.0
-
-    # Resample using resample_poly for higher quality
-    up = 1000
-    down = int(1000 * speed)
-    factor = gcd(up, down)
-    up //= factor
-    down //= factor
-    audio_resampled = resample_poly(audio_float, up, down, axis=0)
-
-    # Normalize to avoid clipping
-    audio_resampled /= np.max(np.abs(audio_resampled)) + 1e-9
-
-    # Play audio
-    sd.play(audio_resampled, samplerate=framerate)
-    sd.wait()
-
 # -----------------------------
 # Record audio
 # -----------------------------
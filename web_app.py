@@ -1,29 +1,68 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response
 from flask_cors import CORS
-import json
 import threading
 import time
 import random
 import os
-from Transcriber import AudioTranscriber
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from Transcriber import AudioTranscriber, MODEL_BUSY
 from LyricsComparison import LyricsComparator
-from spotify_stuff import SpotifyController
+from playback_backends import create_backend
+from song_catalog import load_songs, SongCatalog
+from local_audio_index import LocalAudioIndex
+from session_store import create_session_interface
+from browser_capture import CaptureManager, CaptureError
+from event_bus import EventBus
+import metrics
+import memory_budget
+from profiling import install_profiler
+import tracing
+from tracing import traced
 
 app = Flask(__name__)
 app.secret_key = 'karaoke_secret_key_2024'  # Change this in production
+# Session data lives server-side; the cookie only carries a signed session id
+app.session_interface = create_session_interface()
 CORS(app)
+# Sampling profiler for opted-in requests; off unless $KARAOKE_PROFILE_ENABLED=1
+install_profiler(app)
+
+PREFETCH_WORKERS = 4
+MAX_PREFETCHED_SESSIONS = 64  # oldest prepared songs are dropped beyond this
+JOB_WORKERS = 2  # background transcribe-and-score jobs
+PARTIAL_INTERVAL = 5.0  # seconds of new browser audio between partial transcripts
+PARTIAL_MAX_SECONDS = 15.0  # most audio a single partial transcript decodes
 
 class KaraokeWebGame:
     def __init__(self):
         self.songs_database = self.load_songs_database()
+        self.catalog = SongCatalog(self.songs_database)
         self.transcriber = AudioTranscriber()
         self.comparator = LyricsComparator()
-        self.spotify = SpotifyController()
+        # Live updates (levels, partial transcripts, scores, job status) pushed per session
+        self.events = EventBus()
+        # Singers recording in their browser, decoded per session as chunks arrive
+        self.captures = CaptureManager(on_audio=self.on_capture_audio)
+        self.live = {}  # session id -> lyrics and partial-transcript state of a browser capture
+        self.live_lock = threading.Lock()
+        self.partial_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="partial")
+        self.job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        # Spotify, local-only or fake playback, chosen by $KARAOKE_PLAYBACK_BACKEND
+        self.playback = create_backend()
         self.local_audio_folder = "local_audio"
 
+        # Audio prepared in the background when a song is picked, keyed by session id
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        self.prefetched = OrderedDict()  # session id -> (song id, Future of prepared audio)
+        self.prefetch_lock = threading.Lock()
+
         # Create local audio folder
         if not os.path.exists(self.local_audio_folder):
             os.makedirs(self.local_audio_folder)
+        self.audio_index = LocalAudioIndex(self.local_audio_folder)
+        # Decode local backing tracks in the background so they start instantly
+        self.playback.warm(self.audio_index.paths())
 
         # Mood-based song categorization based on the moods in songs.json
         self.mood_songs = {
@@ -34,9 +73,7 @@ class KaraokeWebGame:
         }
 
     def load_songs_database(self):
-        with open('blind-karaoke/src/lib/database/songs.json', 'r') as f:
-            data = json.load(f)
-            return data['songs']
+        return load_songs()
 
     def get_songs_by_mood(self, mood):
         song_ids = self.mood_songs.get(mood, [])  # Return empty list if mood not found
@@ -51,43 +88,79 @@ class KaraokeWebGame:
         return self.songs_database[0]
 
     def find_local_audio_file(self, song):
-        """Find local audio file for the song using tagged filename"""
-        if not os.path.exists(self.local_audio_folder):
-            return None
+        """Find local audio file for the song (tagged local_audio_file first, then title/artist)"""
+        return self.audio_index.find_for_song(song)
 
-        # First try the tagged local_audio_file from songs.json
-        if 'local_audio_file' in song and song['local_audio_file']:
-            tagged_file = os.path.join(self.local_audio_folder, song['local_audio_file'])
-            if os.path.exists(tagged_file):
-                return tagged_file
-
-        # Fallback to pattern matching if tagged file doesn't exist
-        extensions = ['.mp3', '.wav', '.ogg', '.m4a']
-        patterns = [
-            f"{song['title']}",
-            f"{song['artist']} - {song['title']}",
-            f"{song['title']} - {song['artist']}",
-            f"{song['title'].lower()}",
-            f"{song['artist'].lower()} - {song['title'].lower()}"
-        ]
-
-        for pattern in patterns:
-            for ext in extensions:
-                filename = pattern + ext
-                filepath = os.path.join(self.local_audio_folder, filename)
-                if os.path.exists(filepath):
-                    return filepath
-        return None
-
-    def start_music(self, song):
+    def prepare_music(self, song, wait_for_decode=False):
+        """Resolve the song's audio source: a local file path, or a preview loaded into a buffer"""
         # Try local file first
         local_file = self.find_local_audio_file(song)
-
         if local_file:
-            if self.spotify.play_local_file(local_file):
-                return {'status': 'success', 'source': 'local', 'file': os.path.basename(local_file)}
-        elif song['spotify_track_id']:
-            if self.spotify.play_track(
+            return self.playback.prepare_local_file(local_file, wait_for_decode)
+        if song['spotify_track_id'] and self.playback.use_integrated_player:
+            return self.playback.prepare_track(
+                song['spotify_track_id'],
+                song_title=song['title'],
+                artist=song['artist']
+            )
+        return None
+
+    def prefetch_music(self, session_id, song):
+        """Start preparing a session's song in the background as soon as it is picked"""
+        # Off the request path there is time to finish decoding local files to WAV
+        future = self.prefetch_pool.submit(self.prepare_music, song, True)
+        with self.prefetch_lock:
+            self.prefetched.pop(session_id, None)
+            self.prefetched[session_id] = (song['id'], future)
+            while len(self.prefetched) > MAX_PREFETCHED_SESSIONS:
+                _, (_, stale) = self.prefetched.popitem(last=False)
+                stale.cancel()
+
+    def prefetched_bytes(self):
+        """Audio held by finished prefetches (Spotify previews; local files are kept as paths)"""
+        with self.prefetch_lock:
+            futures = [future for _, future in self.prefetched.values()]
+        total = 0
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                prepared = future.result()
+                total += memory_budget.buffer_bytes(prepared.get('data')) if prepared else 0
+        return total
+
+    def drop_prefetched(self):
+        """Forget every prefetched buffer; those sessions load their song on demand instead"""
+        with self.prefetch_lock:
+            entries = list(self.prefetched.values())
+            self.prefetched.clear()
+        for _, future in entries:
+            future.cancel()
+
+    def take_prefetched(self, session_id, song):
+        """Return the session's prepared audio for song (waiting if still loading), or None"""
+        with self.prefetch_lock:
+            entry = self.prefetched.pop(session_id, None)
+        if not entry or entry[0] != song['id']:
+            return None
+        try:
+            return entry[1].result()
+        except Exception as e:
+            print(f"Prefetch failed, loading on demand: {e}")
+            return None
+
+    def start_music(self, song, session_id=None):
+        prepared = self.take_prefetched(session_id, song) if session_id else None
+        if prepared is None:
+            prepared = self.prepare_music(song)
+
+        if prepared:
+            if self.playback.play_prepared(prepared):
+                result = {'status': 'success', 'source': prepared['source']}
+                if prepared['source'] == 'local':
+                    result['file'] = prepared['label']
+                return result
+        elif song['spotify_track_id'] and not self.playback.use_integrated_player:
+            # Spotify app playback streams on the user's device; nothing to preload
+            if self.playback.play_track(
                 song['spotify_track_id'],
                 song_title=song['title'],
                 artist=song['artist']
@@ -97,7 +170,7 @@ class KaraokeWebGame:
         return {'status': 'error', 'message': 'No audio source available'}
 
     def stop_music(self):
-        self.spotify.pause_playback()
+        self.playback.pause_playback()
         return {'status': 'success'}
 
     def start_recording(self):
@@ -108,6 +181,86 @@ class KaraokeWebGame:
         transcribed_text = self.transcriber.stop_recording()
         return transcribed_text
 
+    def start_capture(self, session_id, capture='server', lyrics=None):
+        """Start recording the singer: the server's microphone, or chunks uploaded by the browser"""
+        if capture == 'browser':
+            try:
+                self.captures.start(session_id)
+            except CaptureError as e:
+                return {'status': 'error', 'message': str(e)}
+            with self.live_lock:
+                self.live[session_id] = {'lyrics': lyrics, 'transcribed_at': 0.0, 'busy': False,
+                                         'decoded_samples': 0, 'text': ''}
+            return {'status': 'success'}
+        return self.start_recording()
+
+    def stop_capture(self, session_id, capture='server'):
+        """Stop recording and transcribe what was captured"""
+        if capture == 'browser':
+            with self.live_lock:
+                self.live.pop(session_id, None)
+            return self.transcriber.transcribe_pcm(self.captures.finish(session_id))
+        return self.stop_recording()
+
+    def on_capture_audio(self, session_id, seconds, level):
+        """Called as browser audio is decoded: push the level, and a partial transcript now and then"""
+        self.events.publish(session_id, 'level', {'level': round(level, 3), 'seconds': round(seconds, 1)})
+        with self.live_lock:
+            live = self.live.get(session_id)
+            if not live or live['busy'] or seconds - live['transcribed_at'] < PARTIAL_INTERVAL:
+                return
+            live['busy'] = True
+            live['transcribed_at'] = seconds
+        self.partial_pool.submit(self.publish_partial, session_id, live)
+
+    @traced("partial_transcript")
+    def publish_partial(self, session_id, live):
+        try:
+            # Only audio since the last partial is decoded, so each partial costs the
+            # same however long the song runs; the text accumulates in live['text']
+            pcm = self.captures.snapshot(session_id, start=live['decoded_samples'])
+            if pcm is None or len(pcm) == 0:
+                return
+            window = pcm[-int(PARTIAL_MAX_SECONDS * 16000):]
+            new_text = self.transcriber.transcribe_pcm(window, partial=True)
+            if new_text is MODEL_BUSY:
+                return  # a final transcription needs the model; retry at the next interval
+            live['decoded_samples'] += len(pcm)
+            if not new_text:
+                return
+            transcribed_text = live['text'] = f"{live['text']} {new_text}".strip()
+            self.events.publish(session_id, 'partial', {'text': transcribed_text})
+            if live['lyrics']:
+                # Score against the part of the song sung so far, not the whole song
+                sung_words = len(transcribed_text.split())
+                reference = " ".join(live['lyrics'].split()[:int(sung_words * 1.2) + 1])
+                results = self.analyze_performance(transcribed_text, reference)
+                self.events.publish(session_id, 'score', {'overall_score': round(results['overall_score'], 1)})
+        finally:
+            live['busy'] = False
+
+    @traced("performance_job", root=True)
+    def run_performance_job(self, session_id, capture, song):
+        """Stop, transcribe and score in the background, reporting progress on the event channel"""
+        try:
+            self.events.publish(session_id, 'status', {'stage': 'transcribing'})
+            transcribed_text = self.stop_capture(session_id, capture)
+            if not (transcribed_text and song):
+                self.events.publish(session_id, 'failed', {'message': 'No transcription available'})
+                return
+
+            self.events.publish(session_id, 'status', {'stage': 'scoring', 'transcribed_text': transcribed_text})
+            results = self.analyze_performance(transcribed_text, song['lyrics'])
+            app.session_interface.update(session_id, results_data={
+                'transcribed_text': transcribed_text,
+                'results': results
+            })
+            self.events.publish(session_id, 'score', {'overall_score': round(results['overall_score'], 1)})
+            self.events.publish(session_id, 'done', {'redirect': '/results'})
+        except Exception as e:
+            print(f"Performance job failed: {e}")
+            self.events.publish(session_id, 'failed', {'message': 'Error processing performance'})
+
     def analyze_performance(self, transcribed_text, song_lyrics):
         results = self.comparator.compare_lyrics(transcribed_text, song_lyrics)
         return results
@@ -115,6 +268,22 @@ class KaraokeWebGame:
 # Global game instance
 game = KaraokeWebGame()
 
+# Gauges read only when /metrics is scraped, so they cost nothing per request
+metrics.ACTIVE_SESSIONS.labels('stored').set_function(lambda: len(app.session_interface.store))
+metrics.ACTIVE_SESSIONS.labels('browser_capture').set_function(lambda: len(game.captures))
+metrics.ACTIVE_SESSIONS.labels('event_stream').set_function(game.events.subscriber_count)
+metrics.track_pool('prefetch', game.prefetch_pool)
+metrics.track_pool('partial_transcript', game.partial_pool)
+metrics.track_pool('performance_job', game.job_pool)
+
+# Memory accounting; caches are shed first when $KARAOKE_MEMORY_BUDGET_MB is exceeded
+memory_budget.register('whisper_model', lambda: memory_budget.model_bytes(game.transcriber.model))
+memory_budget.register('recording_buffer', lambda: memory_budget.buffer_bytes(game.transcriber.audio_data))
+memory_budget.register('browser_captures', game.captures.buffered_bytes)
+memory_budget.register('prefetched_audio', game.prefetched_bytes, shed=game.drop_prefetched, priority=10)
+memory_budget.register('traces', None, shed=tracing.clear_traces, priority=0)
+memory_budget.start_watchdog()
+
 # Routes
 @app.route('/')
 def home():
@@ -128,9 +297,12 @@ def mood_selection():
 def karaoke(mood):
     # Select random song based on mood
     song = game.select_random_song_by_mood(mood)
-    session['current_song'] = song
+    session['current_song'] = dict(song)
     session['mood'] = mood
-    return render_template('karaoke.html', mood=mood, song_title="Mystery Song")
+    # Resolve and download the audio while the user reads the page
+    game.prefetch_music(session.sid, song)
+    return render_template('karaoke.html', mood=mood, song_title="Mystery Song",
+                           browser_capture=game.captures.available)
 
 @app.route('/results')
 def results():
@@ -145,14 +317,33 @@ def results():
                          results=results_data['results'],
                          transcribed_text=results_data['transcribed_text'])
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # API Routes
+@app.route('/api/memory', methods=['GET'])
+def get_memory():
+    """Per-component memory, current and peak RSS, budgets and (with tracemalloc on) top allocation sites"""
+    return jsonify(memory_budget.report(request.args.get('top', memory_budget.TOP_ALLOCATIONS, type=int)))
+
+@app.route('/api/traces', methods=['GET'])
+def get_traces():
+    """Recent timing trees (e.g. of slow takes); ?background=1 for prefetches and partial transcripts"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(tracing.recent_traces(limit, background=request.args.get('background') == '1'))
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify(game.catalog.stats.summary())
+
 @app.route('/api/start-music', methods=['POST'])
 def start_music():
     song = session.get('current_song')
     if not song:
         return jsonify({'status': 'error', 'message': 'No song selected'})
 
-    result = game.start_music(song)
+    result = game.start_music(song, session.sid)
     return jsonify(result)
 
 @app.route('/api/stop-music', methods=['POST'])
@@ -199,12 +390,14 @@ def start_karaoke():
         return jsonify({'status': 'error', 'message': 'No song selected'})
 
     # Start music first
-    music_result = game.start_music(song)
+    music_result = game.start_music(song, session.sid)
     if music_result['status'] != 'success':
         return jsonify(music_result)
 
-    # Start recording
-    recording_result = game.start_recording()
+    # Start recording, from the browser's microphone when the page asks for it
+    capture = (request.get_json(silent=True) or {}).get('capture', 'server')
+    session['capture'] = capture
+    recording_result = game.start_capture(session.sid, capture, song['lyrics'])
     if recording_result['status'] != 'success':
         game.stop_music()  # Stop music if recording fails
         return jsonify(recording_result)
@@ -216,13 +409,43 @@ def start_karaoke():
         'message': 'Karaoke started! Music playing and recording...'
     })
 
+@app.route('/api/upload-chunk', methods=['POST'])
+def upload_chunk():
+    """Next MediaRecorder chunk of the singer's browser recording (?seq=0, 1, 2, ...)"""
+    seq = request.args.get('seq', type=int)
+    try:
+        game.captures.feed(session.sid, seq, request.get_data())
+    except CaptureError as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+    return jsonify({'status': 'success'})
+
+@app.route('/api/events')
+def events():
+    """Server-sent events for this session: level, partial, score, status, done, failed"""
+    if 'current_song' not in session:
+        return jsonify({'status': 'error', 'message': 'No song selected'})
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(
+        game.events.stream(session.sid, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/stop-karaoke', methods=['POST'])
+@traced("stop_karaoke", root=True)
 def stop_karaoke():
     """Combined endpoint: Stop music and recording together"""
-    transcribed_text = game.stop_recording()
-    game.stop_music()
-
     song = session.get('current_song')
+    capture = session.get('capture', 'server')
+
+    if (request.get_json(silent=True) or {}).get('background'):
+        # Reply at once; the result arrives on /api/events as 'done' or 'failed'
+        game.stop_music()
+        game.job_pool.submit(game.run_performance_job, session.sid, capture, song)
+        return jsonify({'status': 'processing'})
+
+    transcribed_text = game.stop_capture(session.sid, capture)
+    game.stop_music()
 
     if transcribed_text and song:
         # Analyze performance